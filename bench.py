@@ -0,0 +1,86 @@
+"""Headless, deterministic benchmark for Cheryl's Cat Adventure.
+
+Runs the game with SDL's dummy video driver, a fixed seed and an uncapped
+fixed-step loop, then reports frames/sec and per-frame percentiles for world
+generation, collision checks and drawing at several travelled distances.
+Cases can also start from saved snapshots (see p.py --snapshot-out and F5).
+
+    python bench.py --frames 600 --distances 0 100000 1000000 --density 1 4
+    python bench.py --snapshot far.ccas
+"""
+import argparse
+import time
+
+import pygame
+
+from p import FrameProfiler, Game, KeyState
+
+REPORTED_PHASES = ("generate_world", "check_collisions", "draw")
+
+
+def scripted_keys(frame):
+    # Always run right, hop between the sidewalk and the balconies every two seconds
+    if frame % 240 < 120:
+        return KeyState((pygame.K_RIGHT, pygame.K_UP))
+    return KeyState((pygame.K_RIGHT, pygame.K_DOWN))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_case(distance, density, frames, seed, snapshot=None):
+    game = Game(headless=True, seed=seed, density=density, fps=0)
+    game.state = "PLAYING"
+    game.reset_game()
+    if snapshot is not None:
+        # Start instantly from a saved world, its own distance and density included
+        game.restore(snapshot)
+    else:
+        game.player.world_x = distance
+        game.update_world()
+    distance, density = game.player.world_x, game.density
+    profiler = game.profiler = FrameProfiler(enabled=True, window=frames)
+
+    start = time.perf_counter()
+    for frame in range(frames):
+        profiler.begin_frame()
+        game.step(scripted_keys(frame))
+        game.draw_playing()
+        profiler.end_frame(game.entity_counts())
+    elapsed = time.perf_counter() - start
+    game.streamer.close()
+    return distance, density, frames / elapsed, {phase: list(profiler.history[phase]) for phase in REPORTED_PHASES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--distances", type=int, nargs="+", default=[0, 100000, 1000000])
+    parser.add_argument("--density", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--snapshot", metavar="PATH", nargs="+", default=[],
+                        help="start cases from saved snapshots instead of --distances")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        cases = []
+        for path in args.snapshot:
+            with open(path, "rb") as snapshot_file:
+                cases.append((0, 1.0, snapshot_file.read()))
+    else:
+        cases = [(distance, density, None) for density in args.density for distance in args.distances]
+
+    print(f"{'distance':>10} {'density':>7} {'fps':>8}  phase             p50 ms   p95 ms   p99 ms")
+    for distance, density, snapshot in cases:
+        distance, density, fps, phases = run_case(distance, density, args.frames, args.seed, snapshot)
+        for i, (name, samples) in enumerate(phases.items()):
+            prefix = f"{distance:>10} {density:>7.1f} {fps:>8.0f}" if i == 0 else " " * 27
+            print(f"{prefix}  {name:<16} " + " ".join(
+                f"{percentile(samples, pct) * 1000:>8.3f}" for pct in (50, 95, 99)))
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
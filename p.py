@@ -1,14 +1,42 @@
+import argparse
+import bisect
+import csv
+import json
+import numpy as np
+import os
 import pygame
+import queue
 import random
+import struct
 import sys
-
-# Initialize Pygame
-pygame.init()
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict, deque
 
 # Constants
 SCREEN_WIDTH = 1000
 SCREEN_HEIGHT = 600
-FPS = 60
+FPS = 60  # Default render cap, independent of the simulation rate
+
+# Simulation timing
+SIM_RATE = 60  # Fixed simulation steps per second
+SIM_DT = 1 / SIM_RATE
+PLAYER_SPEED = 300  # Pixels per second
+MAX_FRAME_TIME = 0.25  # Longer hitches (debugger, window drag) are clamped to this
+MAX_STEPS_PER_FRAME = 5  # Simulation steps one render frame may run to catch up
+MAX_SKIPPED_RENDERS = 2  # Consecutive renders dropped while behind schedule
+
+def steps(seconds):
+    # A duration in whole simulation steps
+    return round(seconds * SIM_RATE)
+
+# Cheryl moves in whole pixels, so her speed has to divide evenly into steps
+if PLAYER_SPEED % SIM_RATE:
+    raise ValueError(f"PLAYER_SPEED {PLAYER_SPEED} isn't a whole number of pixels per step at {SIM_RATE} Hz")
+PLAYER_STEP = PLAYER_SPEED // SIM_RATE
+TOUCH_COOLDOWN = steps(2)  # Steps a touched animal ignores Cheryl
 
 # Colors
 WHITE = (255, 255, 255)
@@ -21,27 +49,267 @@ ORANGE = (255, 165, 0)  # Cats
 BROWN = (139, 69, 19)  # Raccoons
 BLACK = (0, 0, 0)
 RED = (255, 0, 0)  # Hearts
+YELLOW = (255, 230, 90)  # Sparkles
+
+# World streaming
+CHUNK_WIDTH = 1000  # The world is generated in fixed-width chunks
+CHUNKS_BEHIND = 1  # Chunks kept behind the camera before eviction
+CHUNKS_AHEAD = 2  # Chunks kept ahead of the visible window
+CHUNKS_PREFETCH = 1  # Chunks generated in the background beyond each end of the live range
+STREAM_BUDGET = 0.002  # Seconds per frame spent rasterising background chunks
+
+# Spawning
+SPAWN_SPACING = 100  # One spawn roll per slot this wide at density 1
+CAT_CHANCE = 0.3
+BALCONY_CAT_CHANCE = 0.2
+RACCOON_CHANCE = 0.15
+
+# Building windows
+WINDOW_WIDTH = 20
+WINDOW_HEIGHT = 25
+WINDOW_GLOW = (255, 255, 150)  # Occasional warm flicker
+MAX_WINDOWS = 16  # 4 rows x 4 columns at the largest building size
+FLICKER_PERIOD = 120  # Frames before the flicker pattern repeats
+
+def build_flicker_table():
+    # For each frame of the period, which window slots glow instead of showing white
+    rng = random.Random(0)
+    return [tuple(slot for slot in range(MAX_WINDOWS) if rng.random() < 0.1)
+            for frame in range(FLICKER_PERIOD)]
+
+FLICKER_TABLE = build_flicker_table()
+
+# Assets
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSET_CACHE_DIR = os.path.join(ASSET_DIR, ".asset_cache")  # Pre-scaled pixel buffers
+ASSET_CACHE_HEADER = struct.Struct("<4sHQQ")  # magic, version, source mtime_ns, source size
+ASSET_CACHE_MAGIC = b"CCAC"
+ASSET_CACHE_VERSION = 1
+
+# Input recordings
+REPLAY_HEADER = struct.Struct("<4sHBQdI")  # magic, version, flags, seed, density, frames
+REPLAY_MAGIC = b"CCAR"
+REPLAY_VERSION = 2
+REPLAY_HAS_CHECKSUMS = 0x01  # Header flag: one state checksum per frame follows the key masks
+REPLAY_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN)  # Bits 0-3 of a frame
+REPLAY_RESET = 0x10  # Frame bit: the run was restarted with R before this frame
+
+# Snapshots
+SNAPSHOT_HEADER = struct.Struct("<4sHB")  # magic, version, flags
+SNAPSHOT_MAGIC = b"CCAS"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_COMPRESSED = 0x01  # Header flag: the body is zlib-compressed
+SNAPSHOT_HAS_BUILDINGS = 0x02  # Header flag: chunks carry their buildings and windows
+SNAPSHOT_HAS_PARTICLES = 0x04  # Header flag: the particle pool follows the chunks
+SNAPSHOT_STATE = struct.Struct("<qq3q3qIdI")  # frame, score, player, previous player, world seed, density, chunks
+SNAPSHOT_RNG = struct.Struct("<Bd")  # Random state version, gauss_next (NaN for none), then the MT words
+SNAPSHOT_CHUNK = struct.Struct("<qIIII")  # index, buildings, windows, cats, raccoons
+SNAPSHOT_PARTICLES = struct.Struct("<I")  # live particles, then their records
+RNG_STATE_WORDS = 625  # Mersenne Twister state plus its position
+
+# Street rendering
+GROUND_Y = 380  # Top of the sidewalk, buildings stand on it
+LANE_SPACING = 60  # Road markings repeat every this many pixels
+DIRTY_RECT_LIMIT = 0.4  # Above this fraction of the screen a full flip is cheaper
+
+# Particles
+PARTICLE_CAPACITY = 512  # Preallocated, spawns beyond this are dropped
+PARTICLE_HEART = 0
+PARTICLE_SPARKLE = 1
+PARTICLE_TRAIL = 2
+PARTICLE_SPRITES = ("heart", "sparkle", "trail")  # Atlas sprite per particle kind
+SPARKLE_DIRECTIONS = ((-1, -1), (1, -1), (-1, 1), (1, 1))
+SPARKLE_SPEED = 90  # Pixels per second along each axis
+SPARKLE_LIFETIME = 1 / 3  # Seconds
+
+# Start screen
+STAR_SKY_HEIGHT = 300  # Stars are scattered above this line
+STAR_SMALL = ((-1, -1), (0, -1), (-1, 0), (0, 0))  # Pixels pygame.draw.circle covers at radius 1
+STAR_LARGE = STAR_SMALL + ((-1, -2), (0, -2), (-2, -1), (1, -1), (-2, 0), (1, 0), (-1, 1), (0, 1))  # Radius 2
+
+# Profiling
+PROFILE_PHASES = ("events", "player.update", "generate_world", "particles",
+                  "check_collisions", "draw", "overlay", "present", "stream")
+PROFILE_WINDOW = 120  # Frames in the rolling overlay statistics
+OVERLAY_REFRESH = 15  # Frames between overlay redraws
+
+# Render caches
+COLOR_QUANTUM = 4  # Animated colours are snapped to this step before cache lookups
+GRADIENT_CACHE_SIZE = 16
+TEXT_CACHE_SIZE = 256
+
+# Adaptive quality, tier 0 looks best and later tiers shed the costliest effects
+QUALITY_TIERS = (
+    {"glow_passes": 5, "stars": 2000, "floating_cats": 24, "translucent_panel": True, "window_flicker": True},
+    {"glow_passes": 2, "stars": 2000, "floating_cats": 24, "translucent_panel": True, "window_flicker": True},
+    {"glow_passes": 0, "stars": 800, "floating_cats": 12, "translucent_panel": True, "window_flicker": False},
+    {"glow_passes": 0, "stars": 200, "floating_cats": 6, "translucent_panel": False, "window_flicker": False},
+)
+QUALITY_WINDOW = 60  # Frames of work time behind each decision
+QUALITY_STEP_DOWN = 0.9  # Step down when the window's p90 work time exceeds this fraction of the frame budget
+QUALITY_STEP_UP = 0.5  # A window is calm when its p90 stays under this fraction
+QUALITY_CALM_WINDOWS = 3  # Consecutive calm windows before stepping back up
+
+def quantise_color(color, step=COLOR_QUANTUM):
+    return tuple(channel - channel % step for channel in color)
+
+class LRUCache:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+    
+    def get(self, key, build):
+        # Return the cached value for key, building it on a miss and evicting the oldest entry
+        value = self.entries.get(key)
+        if value is None:
+            value = build()
+            self.entries[key] = value
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        return value
+    
+    def clear(self):
+        self.entries.clear()
+
+class DigitAtlas:
+    def __init__(self, font, color):
+        # Pre-render every glyph a HUD number can use
+        self.glyphs = {char: font.render(char, True, color) for char in "0123456789-"}
+    
+    def draw(self, screen, value, pos):
+        # Compose the number from cached glyphs, returns the x just past the last one
+        x, y = pos
+        blits = []
+        for char in str(value):
+            glyph = self.glyphs[char]
+            blits.append((glyph, (x, y)))
+            x += glyph.get_width()
+        screen.blits(blits, False)
+        return x
+
+class TextRenderer:
+    def __init__(self, capacity=TEXT_CACHE_SIZE):
+        self.cache = LRUCache(capacity)
+        self.digit_atlases = {}
+    
+    def render(self, font, text, color):
+        color = quantise_color(color)
+        return self.cache.get((font, text, color), lambda: font.render(text, True, color))
+    
+    def draw_number(self, screen, font, label, value, suffix, color, pos):
+        # Static label and suffix come from the cache, the digits from the glyph atlas
+        atlas = self.digit_atlases.get((font, color))
+        if atlas is None:
+            atlas = self.digit_atlases[(font, color)] = DigitAtlas(font, color)
+        label_surface = self.render(font, label, color)
+        screen.blit(label_surface, pos)
+        x = atlas.draw(screen, value, (pos[0] + label_surface.get_width(), pos[1]))
+        if suffix:
+            x += screen.blit(self.render(font, suffix, color), (x, pos[1])).width
+        return pygame.Rect(pos[0], pos[1], x - pos[0], label_surface.get_height())
+    
+    def clear(self):
+        self.cache.clear()
+        self.digit_atlases.clear()
+
+def make_gradient_surface(color1, color2, width, height):
+    # Vertical gradient built in one vectorised pass
+    ratio = (np.arange(height) / height)[:, None]
+    column = (np.array(color1) * (1 - ratio) + np.array(color2) * ratio).astype(np.uint8)
+    surface = pygame.Surface((width, height))
+    pygame.surfarray.blit_array(surface, np.broadcast_to(column, (width, height, 3)))
+    return surface
+
+class AssetManager:
+    def __init__(self, asset_dir=ASSET_DIR, cache_dir=ASSET_CACHE_DIR):
+        self.asset_dir = asset_dir
+        self.cache_dir = cache_dir
+        self.images = {}  # name -> display-format Surface, or None if it failed to load
+        self.scaled_images = {}  # (name, size) -> display-format Surface
+        self.fonts = {}
+    
+    def convert(self, surface):
+        # Match the display's pixel format so blits don't convert every frame
+        if pygame.display.get_surface() is None:
+            return surface
+        return surface.convert_alpha()
+    
+    def image(self, name):
+        if name not in self.images:
+            try:
+                self.images[name] = self.convert(pygame.image.load(os.path.join(self.asset_dir, name)))
+            except (pygame.error, OSError):
+                self.images[name] = None
+                print(f"Could not load {name}, using simple rectangle instead")
+        return self.images[name]
+    
+    def scaled(self, name, size):
+        key = (name, tuple(size))
+        if key not in self.scaled_images:
+            surface = self.load_cached(name, size)
+            if surface is None:
+                image = self.image(name)
+                if image is not None:
+                    surface = pygame.transform.scale(image, size)
+                    self.store_cached(name, size, surface)
+            self.scaled_images[key] = None if surface is None else self.convert(surface)
+        return self.scaled_images[key]
+    
+    def cache_path(self, name, size):
+        return os.path.join(self.cache_dir, f"{os.path.splitext(name)[0]}-{size[0]}x{size[1]}.rgba")
+    
+    def source_stamp(self, name):
+        stat = os.stat(os.path.join(self.asset_dir, name))
+        return stat.st_mtime_ns, stat.st_size
+    
+    def load_cached(self, name, size):
+        # Raw RGBA pixels scaled on an earlier run, skipping PNG decode and rescale
+        try:
+            with open(self.cache_path(name, size), "rb") as cache_file:
+                magic, version, mtime_ns, source_size = ASSET_CACHE_HEADER.unpack(
+                    cache_file.read(ASSET_CACHE_HEADER.size))
+                pixels = cache_file.read()
+            if (magic, version) != (ASSET_CACHE_MAGIC, ASSET_CACHE_VERSION):
+                return None
+            if (mtime_ns, source_size) != self.source_stamp(name) or len(pixels) != size[0] * size[1] * 4:
+                return None  # Stale, the source image changed
+            return pygame.image.frombytes(pixels, size, "RGBA")
+        except (OSError, struct.error):
+            return None
+    
+    def store_cached(self, name, size, surface):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.cache_path(name, size), "wb") as cache_file:
+                cache_file.write(ASSET_CACHE_HEADER.pack(ASSET_CACHE_MAGIC, ASSET_CACHE_VERSION,
+                                                         *self.source_stamp(name)))
+                cache_file.write(pygame.image.tobytes(surface, "RGBA"))
+        except OSError:
+            pass  # The cache is only an optimisation
+    
+    def font(self, name, size):
+        if (name, size) not in self.fonts:
+            self.fonts[(name, size)] = pygame.font.Font(name, size)
+        return self.fonts[(name, size)]
 
 class Player:
-    def __init__(self):
+    def __init__(self, image=None):
         self.x = 100
         self.y = 400
         self.width = 30
         self.height = 40
-        self.speed = 5
+        self.speed = PLAYER_STEP  # Pixels per simulation step
         self.world_x = 0  # Position in the infinite world
         
-        # Try to load cheryl.png, fallback to rectangle if not found
-        try:
-            self.image = pygame.image.load("cheryl.png")
-            self.image = pygame.transform.scale(self.image, (self.width, self.height))
-            self.has_image = True
-        except:
-            self.has_image = False
-            print("Could not load cheryl.png, using simple rectangle instead")
+        # Use cheryl.png when the asset manager could load it, fallback to rectangle if not
+        self.image = image
+        self.has_image = image is not None
         
-    def update(self):
-        keys = pygame.key.get_pressed()
+    def update(self, keys=None):
+        if keys is None:
+            keys = pygame.key.get_pressed()
         old_x = self.x
         
         if keys[pygame.K_LEFT] and self.world_x > 0:
@@ -59,100 +327,500 @@ class Player:
         if keys[pygame.K_DOWN] and self.y < 450:
             self.y += self.speed
     
-    def draw(self, screen):
+    def draw(self, screen, x=None, y=None):
+        # x and y override the simulated position, e.g. when interpolating between steps
+        x = self.x if x is None else x
+        y = self.y if y is None else y
         if self.has_image:
-            screen.blit(self.image, (self.x, self.y))
+            screen.blit(self.image, (x, y))
         else:
             # Fallback: Draw Cheryl as a pink rectangle
-            pygame.draw.rect(screen, PINK, (self.x, self.y, self.width, self.height))
+            pygame.draw.rect(screen, PINK, (x, y, self.width, self.height))
             # Add a simple face
-            pygame.draw.circle(screen, BLACK, (self.x + 15, self.y + 10), 2)
-            pygame.draw.circle(screen, BLACK, (self.x + 20, self.y + 10), 2)
+            pygame.draw.circle(screen, BLACK, (x + 15, y + 10), 2)
+            pygame.draw.circle(screen, BLACK, (x + 20, y + 10), 2)
             # Simple expression
-            pygame.draw.arc(screen, BLACK, (self.x + 12, self.y + 12, 10, 8), 0, 3.14, 1)
+            pygame.draw.arc(screen, BLACK, (x + 12, y + 12, 10, 8), 0, 3.14, 1)
+
+class SpriteAtlas:
+    def __init__(self):
+        self.surface = None
+        self.sprites = {}  # name -> (area in the atlas, offset from the entity anchor)
+    
+    def build(self, shapes):
+        # shapes: (name, (left, top, width, height) around the anchor, draw(surface, x, y))
+        atlas_width = sum(bounds[2] for name, bounds, draw in shapes)
+        atlas_height = max(bounds[3] for name, bounds, draw in shapes)
+        self.surface = pygame.Surface((atlas_width, atlas_height), pygame.SRCALPHA)
+        self.sprites = {}
+        x = 0
+        for name, (left, top, width, height), draw in shapes:
+            area = pygame.Rect(x, 0, width, height)
+            draw(self.surface.subsurface(area), -left, -top)
+            self.sprites[name] = (area, (left, top))
+            x += width
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert_alpha()
+    
+    def entry(self, name, x, y):
+        # One (source, dest, area) item for Surface.blits
+        area, (left, top) = self.sprites[name]
+        return (self.surface, (x + left, y + top), area)
+
+SPRITES = SpriteAtlas()
+FLOATING_CAT_SIZES = range(16, 32, 2)  # Size buckets for the start-screen cats
+
+def floating_cat_sprite(size):
+    # Snap a start-screen cat to the nearest pre-rendered size bucket
+    bucket = min(FLOATING_CAT_SIZES, key=lambda bucket_size: abs(bucket_size - size))
+    return ("floating_cat", bucket)
+
+def draw_floating_cat_shape(surface, x, y, size):
+    glow_size = int(size * 1.2)
+    
+    # Glow effect
+    pygame.draw.circle(surface, (255, 200, 100), (x, y), glow_size)
+    
+    # Cat body
+    pygame.draw.rect(surface, ORANGE, (x - size//2, y - size//2, size, int(size*0.75)))
+    # Ears
+    ear_size = size // 3
+    pygame.draw.polygon(surface, ORANGE, [
+        (x - size//3, y - size//2),
+        (x - size//6, y - size//2 - ear_size),
+        (x, y - size//2)
+    ])
+    pygame.draw.polygon(surface, ORANGE, [
+        (x, y - size//2),
+        (x + size//6, y - size//2 - ear_size),
+        (x + size//3, y - size//2)
+    ])
+
+def draw_sparkle_shape(surface, x, y):
+    # Small four-pointed star
+    pygame.draw.line(surface, YELLOW, (x - 2, y), (x + 2, y))
+    pygame.draw.line(surface, YELLOW, (x, y - 2), (x, y + 2))
+
+def build_sprites():
+    shapes = [
+        ("cat", (0, -5, 21, 21), lambda surface, x, y: Cat.draw_shape(surface, x, y, ORANGE)),
+        ("raccoon", (0, 0, 25, 20), lambda surface, x, y: Raccoon.draw_shape(surface, x, y, BROWN)),
+        ("raccoon_cooldown", (0, 0, 25, 20), lambda surface, x, y: Raccoon.draw_shape(surface, x, y, (100, 50, 15))),
+        ("heart", (-7, -6, 15, 15), Heart.draw_shape),
+        ("sparkle", (-2, -2, 5, 5), draw_sparkle_shape),
+        ("trail", (-2, -2, 5, 5), lambda surface, x, y: pygame.draw.circle(surface, PINK, (x, y), 2)),
+    ]
+    for size in FLOATING_CAT_SIZES:
+        glow_size = int(size * 1.2)
+        shapes.append((("floating_cat", size), (-glow_size - 1, -glow_size - 1, 2 * glow_size + 3, 2 * glow_size + 3),
+                       lambda surface, x, y, size=size: draw_floating_cat_shape(surface, x, y, size)))
+    SPRITES.build(shapes)
+
+class QualityGovernor:
+    def __init__(self, budget, level=None):
+        # Watches per-frame work time against the frame budget, level None adapts and a number pins a tier
+        self.budget = budget
+        self.adaptive = level is None
+        self.level = level or 0
+        self.samples = []
+        self.calm_windows = 0
+    
+    @property
+    def tier(self):
+        return QUALITY_TIERS[self.level]
+    
+    def record(self, seconds):
+        # Returns True when the tier changed
+        if not self.adaptive:
+            return False
+        self.samples.append(seconds)
+        if len(self.samples) < QUALITY_WINDOW:
+            return False
+        ordered = sorted(self.samples)
+        load = ordered[int(len(ordered) * 0.9)] / self.budget
+        self.samples = []
+        if load > QUALITY_STEP_DOWN and self.level < len(QUALITY_TIERS) - 1:
+            self.level += 1
+            self.calm_windows = 0
+            return True
+        # Climbing back needs sustained headroom, so a tier that only just fits doesn't flap
+        self.calm_windows = self.calm_windows + 1 if load < QUALITY_STEP_UP else 0
+        if self.calm_windows >= QUALITY_CALM_WINDOWS and self.level > 0:
+            self.level -= 1
+            self.calm_windows = 0
+            return True
+        return False
+
+class FrameProfiler:
+    def __init__(self, enabled=False, export_path=None, window=PROFILE_WINDOW):
+        self.enabled = enabled or export_path is not None
+        self.show_overlay = False
+        self.history = {phase: deque(maxlen=window) for phase in PROFILE_PHASES + ("frame",)}
+        self.counts = {}
+        self.current = dict.fromkeys(PROFILE_PHASES, 0.0)
+        self.frame = 0
+        self.last = 0.0
+        self.frame_start = 0.0
+        self.overlay_surface = None
+        self.overlay_font = None
+        self.export_file = None
+        self.writer = None
+        if export_path is not None:
+            self.open_export(export_path)
+    
+    def open_export(self, path):
+        # One row per frame, CSV for .csv paths and JSON lines otherwise
+        self.export_file = open(path, "w", newline="")
+        if path.endswith(".csv"):
+            self.writer = csv.writer(self.export_file)
+            self.writer.writerow(("frame", "frame_ms") + tuple(f"{phase}_ms" for phase in PROFILE_PHASES) +
+                                 ("buildings", "cats", "raccoons", "hearts"))
+    
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        for phase in self.current:
+            self.current[phase] = 0.0
+        self.frame_start = self.last = time.perf_counter()
+    
+    def mark(self, phase):
+        # Charge the time since the previous mark to phase
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[phase] += now - self.last
+        self.last = now
+    
+    def end_frame(self, counts):
+        if not self.enabled:
+            return
+        self.frame += 1
+        self.history["frame"].append(time.perf_counter() - self.frame_start)
+        for phase, seconds in self.current.items():
+            self.history[phase].append(seconds)
+        self.counts = counts
+        if self.export_file is not None:
+            self.export()
+    
+    def export(self):
+        frame_ms = round(self.history["frame"][-1] * 1000, 4)
+        phase_ms = {phase: round(seconds * 1000, 4) for phase, seconds in self.current.items()}
+        if self.writer is not None:
+            self.writer.writerow((self.frame, frame_ms) + tuple(phase_ms.values()) + tuple(self.counts.values()))
+        else:
+            self.export_file.write(json.dumps({"frame": self.frame, "frame_ms": frame_ms,
+                                               "phases": phase_ms, "counts": self.counts}) + "\n")
+    
+    def stats(self, phase):
+        # Rolling average and p99 in milliseconds
+        samples = self.history[phase]
+        if not samples:
+            return 0.0, 0.0
+        ordered = sorted(samples)
+        return (sum(ordered) / len(ordered) * 1000,
+                ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000)
+    
+    def toggle_overlay(self):
+        self.show_overlay = not self.show_overlay
+        if self.show_overlay and not self.enabled:
+            # Start timing mid-frame without charging the gap to the next phase
+            self.enabled = True
+            self.begin_frame()
+    
+    def draw_overlay(self, screen):
+        if not self.show_overlay:
+            return
+        # Statistics change slowly, so only re-render the panel every few frames
+        if self.overlay_surface is None or self.frame % OVERLAY_REFRESH == 0:
+            if self.overlay_font is None:
+                self.overlay_font = pygame.font.Font(None, 20)
+            lines = ["phase               avg ms   p99 ms"]
+            for phase in ("frame",) + PROFILE_PHASES:
+                average, p99 = self.stats(phase)
+                lines.append(f"{phase:<18}{average:>8.2f}{p99:>9.2f}")
+            lines.append("  ".join(f"{name} {count}" for name, count in self.counts.items()))
+            line_height = self.overlay_font.get_linesize()
+            self.overlay_surface = pygame.Surface((300, line_height * len(lines) + 10), pygame.SRCALPHA)
+            self.overlay_surface.fill((0, 0, 0, 170))
+            for i, line in enumerate(lines):
+                self.overlay_surface.blit(self.overlay_font.render(line, True, WHITE), (8, 5 + i * line_height))
+        return screen.blit(self.overlay_surface, (SCREEN_WIDTH - self.overlay_surface.get_width() - 10, 10))
+    
+    def close(self):
+        if self.export_file is not None:
+            self.export_file.close()
+            self.export_file = None
+
+def store_field(name):
+    # Property that reads and writes one column of the entity's backing store
+    def get(self):
+        return getattr(self.store, name)[self.index].item()
+    def set(self, value):
+        getattr(self.store, name)[self.index] = value
+    return property(get, set)
+
+class EntityStore:
+    FIELDS = (("world_x", np.int64), ("y", np.int32), ("width", np.int16), ("height", np.int16),
+              ("ready_frame", np.int64), ("on_balcony", np.bool_))
+    
+    def __init__(self, view_class, columns=None):
+        # Struct-of-arrays storage, rows kept sorted by world_x
+        self.view_class = view_class
+        columns = columns or {}
+        for name, dtype in self.FIELDS:
+            setattr(self, name, np.asarray(columns.get(name, ()), dtype=dtype))
+        self.max_width = int(self.width.max()) if len(self.width) else 0
+    
+    @classmethod
+    def from_records(cls, view_class, records):
+        # records: (world_x, y, on_balcony) tuples for one kind of entity
+        records = sorted(records, key=lambda record: record[0])
+        return cls(view_class, {
+            "world_x": [record[0] for record in records],
+            "y": [record[1] for record in records],
+            "width": [view_class.width] * len(records),
+            "height": [view_class.height] * len(records),
+            "ready_frame": [0] * len(records),
+            "on_balcony": [record[2] for record in records],
+        })
+    
+    @classmethod
+    def concatenate(cls, view_class, stores):
+        # Stores cover disjoint, ordered x ranges (Chunk clamps its spawns) so the result stays sorted
+        return cls(view_class, {name: np.concatenate([getattr(store, name) for store in stores])
+                                for name, dtype in cls.FIELDS} if stores else None)
+    
+    def __len__(self):
+        return len(self.world_x)
+    
+    def __getitem__(self, index):
+        return self.view_class(self, index)
+    
+    def __iter__(self):
+        return (self.view_class(self, index) for index in range(len(self)))
+    
+    def available(self, index, frame):
+        # A touched row stores the frame its cooldown ends, so nothing needs counting down
+        return self.ready_frame[index] <= frame
+    
+    def cooldowns(self, frame, lo=0, hi=None):
+        # Frames of cooldown left per row, 0 once available
+        return np.maximum(self.ready_frame[lo:hi] - frame, 0)
+    
+    def span(self, start_x, end_x):
+        # Row range that can overlap [start_x, end_x)
+        lo = np.searchsorted(self.world_x, start_x - self.max_width, "left")
+        hi = np.searchsorted(self.world_x, end_x, "left")
+        return int(lo), int(hi)
+    
+    def colliding(self, rect, frame):
+        # Rows ready to be touched whose rectangles overlap rect, same test as Rect.colliderect
+        lo, hi = self.span(rect.left, rect.right)
+        world_x, y = self.world_x[lo:hi], self.y[lo:hi]
+        hit = ((self.ready_frame[lo:hi] <= frame) &
+               (world_x < rect.right) & (world_x + self.width[lo:hi] > rect.left) &
+               (y < rect.bottom) & (y + self.height[lo:hi] > rect.top))
+        return lo + np.flatnonzero(hit)
 
 class Cat:
-    def __init__(self, world_x, y, on_balcony=False):
-        self.world_x = world_x
-        self.y = y
-        self.width = 20
-        self.height = 15
-        self.on_balcony = on_balcony
-        self.cooldown = 0  # Cooldown after being touched
+    width = 20
+    height = 15
+    
+    # Thin view onto one row of an EntityStore
+    world_x = store_field("world_x")
+    y = store_field("y")
+    on_balcony = store_field("on_balcony")
+    ready_frame = store_field("ready_frame")  # First frame it can be touched again
+    
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
         
-    def update(self):
-        if self.cooldown > 0:
-            self.cooldown -= 1
+    def available(self, frame):
+        return bool(self.store.available(self.index, frame))
             
     def get_screen_x(self, camera_x):
         return self.world_x - camera_x
+    
+    def sprite(self, frame):
+        return "cat"  # No separate cooldown look: ORANGE if self.available(frame) else (255, 200, 150)
+    
+    @staticmethod
+    def draw_shape(surface, x, y, color):
+        # Draw cat as orange rectangle with ears
+        pygame.draw.rect(surface, color, (x, y, 20, 15))
+        # Ears
+        pygame.draw.polygon(surface, color, [(x + 3, y), (x + 7, y - 5), (x + 10, y)])
+        pygame.draw.polygon(surface, color, [(x + 12, y), (x + 15, y - 5), (x + 18, y)])
+        # Eyes
+        pygame.draw.circle(surface, BLACK, (x + 6, y + 5), 1)
+        pygame.draw.circle(surface, BLACK, (x + 14, y + 5), 1)
         
-    def draw(self, screen, camera_x):
+    def draw(self, screen, camera_x, frame):
         screen_x = self.get_screen_x(camera_x)
         if -50 < screen_x < SCREEN_WIDTH + 50:  # Only draw if on screen
-            # Draw cat as orange rectangle with ears
-            color = ORANGE # if self.cooldown == 0 else (255, 200, 150)  # Lighter when in cooldown
-            pygame.draw.rect(screen, color, (screen_x, self.y, self.width, self.height))
-            # Ears
-            pygame.draw.polygon(screen, color, [(screen_x + 3, self.y), (screen_x + 7, self.y - 5), (screen_x + 10, self.y)])
-            pygame.draw.polygon(screen, color, [(screen_x + 12, self.y), (screen_x + 15, self.y - 5), (screen_x + 18, self.y)])
-            # Eyes
-            pygame.draw.circle(screen, BLACK, (screen_x + 6, self.y + 5), 1)
-            pygame.draw.circle(screen, BLACK, (screen_x + 14, self.y + 5), 1)
+            screen.blit(*SPRITES.entry(self.sprite(frame), screen_x, self.y))
 
 class Raccoon:
-    def __init__(self, world_x, y):
-        self.world_x = world_x
-        self.y = y
-        self.width = 25
-        self.height = 20
-        self.cooldown = 0
+    width = 25
+    height = 20
+    
+    # Thin view onto one row of an EntityStore
+    world_x = store_field("world_x")
+    y = store_field("y")
+    ready_frame = store_field("ready_frame")
+    
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
         
-    def update(self):
-        if self.cooldown > 0:
-            self.cooldown -= 1
+    def available(self, frame):
+        return bool(self.store.available(self.index, frame))
             
     def get_screen_x(self, camera_x):
         return self.world_x - camera_x
+    
+    def sprite(self, frame):
+        return "raccoon" if self.available(frame) else "raccoon_cooldown"  # Darker when in cooldown
+    
+    @staticmethod
+    def draw_shape(surface, x, y, color):
+        # Draw raccoon as brown rectangle
+        pygame.draw.rect(surface, color, (x, y, 25, 20))
+        # Mask-like face
+        pygame.draw.ellipse(surface, BLACK, (x + 5, y + 3, 15, 8))
+        pygame.draw.ellipse(surface, WHITE, (x + 7, y + 5, 4, 3))
+        pygame.draw.ellipse(surface, WHITE, (x + 14, y + 5, 4, 3))
+        # Eyes
+        pygame.draw.circle(surface, BLACK, (x + 9, y + 6), 1)
+        pygame.draw.circle(surface, BLACK, (x + 16, y + 6), 1)
         
-    def draw(self, screen, camera_x):
+    def draw(self, screen, camera_x, frame):
         screen_x = self.get_screen_x(camera_x)
         if -50 < screen_x < SCREEN_WIDTH + 50:  # Only draw if on screen
-            # Draw raccoon as brown rectangle
-            color = BROWN if self.cooldown == 0 else (100, 50, 15)  # Darker when in cooldown
-            pygame.draw.rect(screen, color, (screen_x, self.y, self.width, self.height))
-            # Mask-like face
-            pygame.draw.ellipse(screen, BLACK, (screen_x + 5, self.y + 3, 15, 8))
-            pygame.draw.ellipse(screen, WHITE, (screen_x + 7, self.y + 5, 4, 3))
-            pygame.draw.ellipse(screen, WHITE, (screen_x + 14, self.y + 5, 4, 3))
-            # Eyes
-            pygame.draw.circle(screen, BLACK, (screen_x + 9, self.y + 6), 1)
-            pygame.draw.circle(screen, BLACK, (screen_x + 16, self.y + 6), 1)
+            screen.blit(*SPRITES.entry(self.sprite(frame), screen_x, self.y))
 
 class Heart:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.start_y = y
-        self.lifetime = 60  # Frames to live
-        
+    lifetime = steps(1)  # Steps to live
+    speed = 120 / SIM_RATE  # Float upward at 120 pixels per second, particles keep fractional positions
+    
+    @staticmethod
+    def draw_shape(surface, x, y):
+        # Draw a simple heart shape
+        pygame.draw.circle(surface, RED, (x - 3, y - 2), 4)
+        pygame.draw.circle(surface, RED, (x + 3, y - 2), 4)
+        pygame.draw.polygon(surface, RED, [(x - 6, y), (x, y + 8), (x + 6, y)])
+
+class ParticlePool:
+    X, Y, VX, VY, LIFE, KIND = range(6)  # Columns of a particle record
+    
+    def __init__(self, capacity=PARTICLE_CAPACITY):
+        # Live particles are packed into the first `count` rows
+        self.records = np.zeros((capacity, 6), dtype=np.float32)
+        self.count = 0
+    
+    def __len__(self):
+        return self.count
+    
+    def spawn(self, kind, x, y, vx=0.0, vy=0.0, lifetime=Heart.lifetime):
+        if self.count == len(self.records):
+            return  # Pool is full
+        self.records[self.count] = (x, y, vx, vy, lifetime, kind)
+        self.count += 1
+    
     def update(self):
-        self.y -= 2  # Float upward
-        self.lifetime -= 1
+        live = self.records[:self.count]
+        live[:, self.X] += live[:, self.VX]
+        live[:, self.Y] += live[:, self.VY]
+        live[:, self.LIFE] -= 1
+        # Swap-remove expired particles, highest index first so survivors fill the holes
+        for index in np.flatnonzero(live[:, self.LIFE] <= 0)[::-1].tolist():
+            self.count -= 1
+            if index != self.count:
+                self.records[index] = self.records[self.count]
+    
+    def count_kind(self, kind):
+        return int(np.count_nonzero(self.records[:self.count, self.KIND] == kind))
+    
+    def blits(self, alpha=1.0):
+        # Surface.blits items for every live particle, alpha of the way from the previous step
+        live = self.records[:self.count]
+        back = 1.0 - alpha
+        xs = live[:, self.X] - live[:, self.VX] * back
+        ys = live[:, self.Y] - live[:, self.VY] * back
+        return [SPRITES.entry(PARTICLE_SPRITES[kind], x, y) for x, y, kind in zip(
+            xs.astype(np.int32).tolist(), ys.astype(np.int32).tolist(), live[:, self.KIND].astype(np.int8).tolist())]
+    
+    def clear(self):
+        self.count = 0
+
+class StartScreenEffects:
+    def __init__(self, rng, stars, cats):
+        # Stars and floating cats as parallel NumPy arrays, rng is a numpy Generator.
+        # Angles are in degrees, as in the Vector2.rotate version this replaced
+        direction = np.radians(rng.uniform(0, 6.28, cats))
+        speed = rng.uniform(0.5, 2.0, cats)
+        self.cat_x = rng.integers(50, SCREEN_WIDTH - 50, cats, endpoint=True).astype(np.float64)
+        self.cat_y = rng.integers(200, 500, cats, endpoint=True).astype(np.float64)
+        self.cat_vx = speed * np.cos(direction) * 0.5
+        self.cat_vy = speed * np.sin(direction) * 0.3
+        self.cat_bob_offset = rng.uniform(0, 6.28, cats)
+        self.cat_sprites = [floating_cat_sprite(int(20 * size)) for size in rng.uniform(0.8, 1.5, cats).tolist()]
         
-    def draw(self, screen):
-        if self.lifetime > 0:
-            # Draw a simple heart shape
-            pygame.draw.circle(screen, RED, (self.x - 3, self.y - 2), 4)
-            pygame.draw.circle(screen, RED, (self.x + 3, self.y - 2), 4)
-            pygame.draw.polygon(screen, RED, [(self.x - 6, self.y), (self.x, self.y + 8), (self.x + 6, self.y)])
+        self.star_x = rng.integers(0, SCREEN_WIDTH, stars)
+        self.star_y = rng.integers(0, STAR_SKY_HEIGHT, stars, endpoint=True)
+        self.star_brightness = rng.integers(100, 255, stars, endpoint=True)
+        self.star_twinkle = rng.uniform(0.05, 0.15, stars)
+        self.star_large = rng.random(stars) < 0.5  # Radius 2 rather than 1, fixed per star
+    
+    def update_cats(self, ticks, start_time, count):
+        # Drift, bob and wrap the first count cats in place
+        x, y = self.cat_x[:count], self.cat_y[:count]
+        x += self.cat_vx[:count] * ticks
+        bob = 3 * np.sin(np.radians(start_time * 0.1 + self.cat_bob_offset[:count]))
+        y += (self.cat_vy[:count] + bob * 0.1) * ticks
+        
+        # Wrap around screen
+        x[x < -30] = SCREEN_WIDTH + 30
+        x[x > SCREEN_WIDTH + 30] = -30
+        y[y < -30] = SCREEN_HEIGHT + 30
+        y[y > SCREEN_HEIGHT + 30] = -30
+    
+    def draw_cats(self, screen, count):
+        screen.blits([SPRITES.entry(sprite, x, y) for sprite, x, y in zip(
+            self.cat_sprites, self.cat_x[:count].astype(np.int32).tolist(),
+            self.cat_y[:count].astype(np.int32).tolist())], False)
+    
+    def draw_stars(self, screen, start_time, count):
+        # Write the first count stars straight into the screen's pixels, each a radius 1 or 2 dot
+        brightness = np.minimum(255, self.star_brightness[:count] + (
+            50 * np.abs(np.cos(np.radians(start_time * self.star_twinkle[:count])))).astype(np.int64))
+        x, y = self.star_x[:count], self.star_y[:count]
+        large = self.star_large[:count]
+        large_x, large_y, large_brightness = x[large], y[large], brightness[large]
+        width, height = screen.get_size()
+        pixels = pygame.surfarray.pixels3d(screen)
+        for dx, dy in STAR_LARGE:
+            if (dx, dy) in STAR_SMALL:
+                star_x, star_y, star_brightness = x + dx, y + dy, brightness
+            else:
+                star_x, star_y, star_brightness = large_x + dx, large_y + dy, large_brightness
+            inside = (star_x >= 0) & (star_x < width) & (star_y >= 0) & (star_y < height)
+            pixels[star_x[inside], star_y[inside]] = star_brightness[inside, None]
+        del pixels  # Unlock the screen
 
 class Building:
-    def __init__(self, world_x, width, height):
+    glow_surface = None  # Shared pre-rendered glowing window
+    
+    def __init__(self, world_x, width, height, rng=random):
         self.world_x = world_x
         self.width = width
         self.height = height
         self.windows = []
+        self.surface = None  # Rasterised building, only while it is in the live world
+        self.offsets = None
+        self.glow_areas = None
+        self.flicker_phase = rng.randrange(FLICKER_PERIOD)  # Desync neighbouring buildings
         # Generate random windows - fix window positioning
         ground_y = 380  # Top of sidewalk
         building_y = ground_y - height
@@ -162,7 +830,7 @@ class Building:
         
         for row in range(rows):
             for col in range(cols):
-                if random.random() > 0.3:  # Some windows are dark
+                if rng.random() > 0.3:  # Some windows are dark
                     window_x = world_x + 15 + col * 40
                     window_y = building_y + 20 + row * 50  # Relative to building top
                     # Make sure window is within building bounds
@@ -170,226 +838,768 @@ class Building:
                         window_y + 25 < building_y + height - 15):
                         self.windows.append((window_x, window_y))
     
-    def draw(self, screen, camera_x):
+    @classmethod
+    def restore(cls, world_x, width, height, flicker_phase, windows):
+        # Rebuild a building from snapshot data without rolling its windows again
+        building = cls.__new__(cls)
+        building.world_x = world_x
+        building.width = width
+        building.height = height
+        building.windows = windows
+        building.surface = None
+        building.offsets = None
+        building.glow_areas = None
+        building.flicker_phase = flicker_phase
+        return building
+    
+    def window_offsets(self):
+        # Window positions relative to the building's top-left corner
+        return [(window_x - self.world_x, window_y - 70) for window_x, window_y in self.windows]
+    
+    def prepare(self):
+        # Rasterise the building once with every window lit white
+        self.surface = pygame.Surface((self.width, self.height))
+        self.surface.fill(DARK_GRAY)
+        self.offsets = self.window_offsets()
+        for offset_x, offset_y in self.offsets:
+            pygame.draw.rect(self.surface, WHITE, (offset_x, offset_y, WINDOW_WIDTH, WINDOW_HEIGHT))
+        # The shifted offsets put some windows past the building's foot, where the sidewalk used to
+        # cover them, so each glow is cropped to the part inside the building (None if nothing is)
+        self.glow_areas = [pygame.Rect(0, 0, WINDOW_WIDTH, min(WINDOW_HEIGHT, self.height - offset_y))
+                           if offset_y < self.height else None for offset_x, offset_y in self.offsets]
+        if Building.glow_surface is None:
+            Building.glow_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+            Building.glow_surface.fill(WINDOW_GLOW)
+    
+    def release(self):
+        self.surface = None
+        self.offsets = None
+        self.glow_areas = None
+    
+    def blit_base(self, surface, camera_x):
+        # The cached building with every window lit, no flicker
+        if self.surface is None:
+            self.prepare()
+        surface.blit(self.surface, (self.world_x - camera_x, GROUND_Y - self.height))
+    
+    def flicker_blits(self, camera_x, frame):
+        # This frame's glowing windows as Surface.blits items
+        if self.surface is None:
+            self.prepare()
+        screen_x = self.world_x - camera_x
+        building_y = GROUND_Y - self.height
+        lit = FLICKER_TABLE[(frame + self.flicker_phase) % FLICKER_PERIOD]
+        offsets = self.offsets
+        areas = self.glow_areas
+        return [(Building.glow_surface, (screen_x + offsets[slot][0], building_y + offsets[slot][1]), areas[slot])
+                for slot in lit if slot < len(offsets) and areas[slot] is not None]
+    
+    def draw(self, screen, camera_x, frame=0):
         screen_x = self.world_x - camera_x
         if screen_x < SCREEN_WIDTH + 100 and screen_x + self.width > -100:
-            # Draw building 
-            ground_y = 380  # Top of sidewalk
-            building_y = ground_y - self.height
-            pygame.draw.rect(screen, DARK_GRAY, (screen_x, building_y, self.width, self.height))
-            # Draw windows
-            for window_x, window_y in self.windows:
-                window_screen_x = window_x - camera_x
-                if -50 < window_screen_x < SCREEN_WIDTH + 50:
-                    # Adjust window Y position relative to building base
-                    adjusted_window_y = building_y + (window_y - 70)
-                    color = WHITE if random.random() > 0.1 else (255, 255, 150)
-                    pygame.draw.rect(screen, color, (window_screen_x, adjusted_window_y, 20, 25))
-
-class Game:
+            self.blit_base(screen, camera_x)
+            # Composite this frame's flickering windows over the cached surface
+            screen.blits(self.flicker_blits(camera_x, frame), False)
+
+class StreetRenderer:
     def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Cheryl's Cat Adventure")
-        self.clock = pygame.time.Clock()
-        self.state = "START"  # START, PLAYING, GAME_OVER
-        self.start_time = 0  # For animations
-        self.floating_cats = []  # Animated cats on start screen
-        self.stars = []  # Background stars
-        self.reset_game()
-        self.init_start_screen_effects()
-        
-    def reset_game(self):
-        self.player = Player()
-        self.cats = []
-        self.raccoons = []
-        self.hearts = []
+        self.background = None  # Sky, buildings and road for camera_x
+        self.ground = None  # Sidewalk, road and one extra lane period to scroll through
+        self.camera_x = None
+        self.full = True  # Whether this frame repaints the whole screen
+        self.previous_rects = []
+        self.rects = []
+    
+    def invalidate(self):
+        self.camera_x = None
+    
+    def build_layers(self):
+        display_ready = pygame.display.get_surface() is not None
+        self.background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.ground = pygame.Surface((SCREEN_WIDTH + LANE_SPACING, SCREEN_HEIGHT - GROUND_Y))
+        if display_ready:
+            self.background = self.background.convert()
+            self.ground = self.ground.convert()
+        # Sidewalk
+        self.ground.fill(GRAY, (0, 0, self.ground.get_width(), 120))
+        # Road
+        self.ground.fill(BLACK, (0, 500 - GROUND_Y, self.ground.get_width(), 100))
+        # Road lines
+        for i in range(0, self.ground.get_width(), LANE_SPACING):
+            self.ground.fill(WHITE, (i, 545 - GROUND_Y, 30, 5))
+    
+    def scroll_to(self, camera_x, building_index):
+        # Move the background to camera_x, repainting only the exposed edge
+        if self.background is None:
+            self.build_layers()
+        if self.camera_x == camera_x:
+            return False
+        dx = None if self.camera_x is None else camera_x - self.camera_x
+        self.camera_x = camera_x
+        if dx is None or abs(dx) >= SCREEN_WIDTH:
+            self.repaint(0, SCREEN_WIDTH, building_index)
+        else:
+            self.background.scroll(-dx, 0)
+            if dx > 0:
+                self.repaint(SCREEN_WIDTH - dx, dx, building_index)
+            else:
+                self.repaint(0, -dx, building_index)
+        return True
+    
+    def repaint(self, x, width, building_index):
+        background = self.background
+        background.set_clip((x, 0, width, SCREEN_HEIGHT))
+        # Sky
+        background.fill(BLUE, (x, 0, width, GROUND_Y))
+        for building in building_index.query(self.camera_x + x, self.camera_x + x + width):
+            building.blit_base(background, self.camera_x)
+        # Sidewalk, road and road lines (moving with camera)
+        line_offset = int(self.camera_x % LANE_SPACING)
+        background.blit(self.ground, (x, GROUND_Y), (x + line_offset, 0, width, SCREEN_HEIGHT - GROUND_Y))
+        background.set_clip(None)
+    
+    def begin(self, screen, camera_x, building_index):
+        # Bring the screen back to a clean background for this frame
+        self.full = self.scroll_to(camera_x, building_index) or not self.previous_rects
+        if self.full:
+            screen.blit(self.background, (0, 0))
+        else:
+            # The camera hasn't moved, so only last frame's sprites need erasing
+            screen.blits([(self.background, rect, rect) for rect in self.previous_rects], False)
+    
+    def add(self, rects):
+        self.rects.extend(rects)
+    
+    def present(self):
+        dirty = self.previous_rects + self.rects
+        self.previous_rects, self.rects = self.rects, []
+        if self.full or sum(rect.width * rect.height for rect in dirty) > DIRTY_RECT_LIMIT * SCREEN_WIDTH * SCREEN_HEIGHT:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
+
+class SpatialIndex:
+    def __init__(self, items):
+        # Entities sorted by world_x so range queries are a pair of bisects
+        self.items = sorted(items, key=lambda item: item.world_x)
+        self.keys = [item.world_x for item in self.items]
+        self.max_width = max((item.width for item in self.items), default=0)
+    
+    def query(self, start_x, end_x):
+        # Anything starting up to max_width before start_x can still reach into the range
+        lo = bisect.bisect_left(self.keys, start_x - self.max_width)
+        hi = bisect.bisect_left(self.keys, end_x)
+        return self.items[lo:hi]
+
+class KeyState:
+    def __init__(self, pressed=()):
+        # Stands in for pygame.key.get_pressed() when input is scripted
+        self.pressed = frozenset(pressed)
+    
+    def __getitem__(self, key):
+        return key in self.pressed
+
+def pack_keys(keys):
+    # The movement keys Player.update reads, as one byte
+    mask = 0
+    for bit, key in enumerate(REPLAY_KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+def unpack_keys(mask):
+    return KeyState(key for bit, key in enumerate(REPLAY_KEYS) if mask & (1 << bit))
+
+class InputRecording:
+    def __init__(self, seed, density=1.0, masks=b"", checksums=()):
+        if not 0 <= seed < 2 ** 64:
+            # Checked up front, the header can't store it and the session would be lost at save time
+            raise ValueError(f"Recording seed {seed} is outside 0 to 2**64 - 1")
+        self.seed = seed
+        self.density = density
+        self.masks = bytearray(masks)  # One key mask per gameplay frame
+        self.checksums = array("I", checksums)  # Game.state_checksum after each frame
+    
+    def __len__(self):
+        return len(self.masks)
+    
+    def append(self, mask, checksum):
+        self.masks.append(mask)
+        self.checksums.append(checksum)
+    
+    def save(self, path):
+        checksums = array("I", self.checksums)
+        if sys.byteorder == "big":
+            checksums.byteswap()  # Stored little-endian
+        flags = REPLAY_HAS_CHECKSUMS if len(checksums) == len(self.masks) else 0
+        body = bytes(self.masks) + (checksums.tobytes() if flags else b"")
+        with open(path, "wb") as replay_file:
+            replay_file.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, flags, self.seed,
+                                                 self.density, len(self.masks)))
+            replay_file.write(zlib.compress(body, 9))
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as replay_file:
+            data = replay_file.read()
+        magic, version, flags, seed, density, frames = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path} is not a version {REPLAY_VERSION} recording")
+        body = zlib.decompress(data[REPLAY_HEADER.size:])
+        checksums = array("I")
+        if flags & REPLAY_HAS_CHECKSUMS:
+            checksums.frombytes(body[frames:])
+            if sys.byteorder == "big":
+                checksums.byteswap()
+        return cls(seed, density, body[:frames], checksums)
+
+def pack_array(values, dtype):
+    # Snapshot arrays are stored little-endian whatever the host
+    return np.asarray(values, dtype=np.dtype(dtype).newbyteorder("<")).tobytes()
+
+class SnapshotReader:
+    def __init__(self, data):
+        # Walks a snapshot body front to back
+        self.data = data
+        self.offset = 0
+    
+    def unpack(self, layout):
+        values = layout.unpack_from(self.data, self.offset)
+        self.offset += layout.size
+        return values
+    
+    def array(self, dtype, count):
+        # Copied into native byte order so the restored arrays are writable
+        dtype = np.dtype(dtype)
+        values = np.frombuffer(self.data, dtype.newbyteorder("<"), count, self.offset)
+        self.offset += values.nbytes
+        return values.astype(dtype)
+
+def chunk_rng(seed, index, kind):
+    return random.Random(f"{seed}:{index}:{kind}")
+
+class Chunk:
+    def __init__(self, index, seed, density=1.0, with_buildings=True):
+        self.index = index
+        self.density = density
+        self.start_x = index * CHUNK_WIDTH
+        self.end_x = self.start_x + CHUNK_WIDTH
         self.buildings = []
-        self.score = 0
-        self.font = pygame.font.Font(None, 36)
-        self.big_font = pygame.font.Font(None, 72)
-        self.spawn_timer = 0
-        self.last_spawn_x = 0
         
-        # Generate initial world
-        self.generate_world(0, 2000)
+        # Every chunk gets its own RNGs so an evicted chunk regenerates identically,
+        # and animals don't depend on whether the buildings were generated at all
+        if with_buildings:
+            self.generate_buildings(chunk_rng(seed, index, "buildings"))
+        self.generate_animals(chunk_rng(seed, index, "animals"))
     
-    def init_start_screen_effects(self):
-        # Create floating cats for start screen
-        self.floating_cats = []
-        for i in range(8):
-            x = random.randint(50, SCREEN_WIDTH - 50)
-            y = random.randint(200, 500)
-            speed = random.uniform(0.5, 2.0)
-            direction = random.uniform(0, 6.28)  # Random direction in radians
-            self.floating_cats.append({
-                'x': x, 'y': y, 'speed': speed, 'direction': direction,
-                'bob_offset': random.uniform(0, 6.28), 'size': random.uniform(0.8, 1.5)
-            })
-        
-        # Create background stars
-        self.stars = []
-        for i in range(50):
-            x = random.randint(0, SCREEN_WIDTH)
-            y = random.randint(0, 300)
-            brightness = random.randint(100, 255)
-            twinkle_speed = random.uniform(0.05, 0.15)
-            self.stars.append({'x': x, 'y': y, 'brightness': brightness, 'twinkle_speed': twinkle_speed})
+    @classmethod
+    def restore(cls, index, density, buildings, cats, raccoons):
+        # Rebuild a chunk from snapshot data instead of generating it
+        chunk = cls.__new__(cls)
+        chunk.index = index
+        chunk.density = density
+        chunk.start_x = index * CHUNK_WIDTH
+        chunk.end_x = chunk.start_x + CHUNK_WIDTH
+        chunk.buildings = buildings
+        chunk.cats = cats
+        chunk.raccoons = raccoons
+        return chunk
     
-    def draw_gradient_background(self, color1, color2):
-        # Create a vertical gradient
-        for y in range(SCREEN_HEIGHT):
-            ratio = y / SCREEN_HEIGHT
-            r = int(color1[0] * (1 - ratio) + color2[0] * ratio)
-            g = int(color1[1] * (1 - ratio) + color2[1] * ratio)
-            b = int(color1[2] * (1 - ratio) + color2[2] * ratio)
-            pygame.draw.line(self.screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+    def generate_buildings(self, rng):
+        # Generate buildings, clipped to the chunk so neighbours never overlap
+        current_x = self.start_x
+        while current_x < self.end_x:
+            width = min(rng.randint(100, 200), self.end_x - current_x)
+            height = rng.randint(150, 250)
+            if width < 40:
+                break
+            self.buildings.append(Building(current_x, width, height, rng))
+            current_x += width + rng.randint(20, 50)
     
-    def generate_world(self, start_x, end_x):
-        # Generate buildings
-        current_x = start_x
-        while current_x < end_x:
-            width = random.randint(100, 200)
-            height = random.randint(150, 250)
-            self.buildings.append(Building(current_x, width, height))
-            current_x += width + random.randint(20, 50)
-        
-        # Generate cats and raccoons
-        for x in range(start_x, end_x, 100):
+    def generate_animals(self, rng):
+        # Generate cats and raccoons, denser worlds just roll more often
+        spacing = max(1, int(SPAWN_SPACING / self.density))
+        # Jitter is clamped to the chunk, so concatenated chunks stay sorted at any density
+        last_x = self.end_x - 1
+        cats = []
+        raccoons = []
+        for x in range(self.start_x, self.end_x, spacing):
             # Cats on sidewalk
-            if random.random() < 0.3:
-                y = random.randint(420, 470)
-                self.cats.append(Cat(x + random.randint(0, 80), y, False))
+            if rng.random() < CAT_CHANCE:
+                y = rng.randint(420, 470)
+                cats.append((min(x + rng.randint(0, 80), last_x), y, False))
             
             # Cats on balconies
-            if random.random() < 0.2:
-                y = random.randint(250, 320)
-                self.cats.append(Cat(x + random.randint(0, 80), y, True))
+            if rng.random() < BALCONY_CAT_CHANCE:
+                y = rng.randint(250, 320)
+                cats.append((min(x + rng.randint(0, 80), last_x), y, True))
             
             # Raccoons
-            if random.random() < 0.15:
-                y = random.randint(410, 460)
-                self.raccoons.append(Raccoon(x + random.randint(0, 80), y))
+            if rng.random() < RACCOON_CHANCE:
+                y = rng.randint(410, 460)
+                raccoons.append((min(x + rng.randint(0, 80), last_x), y, False))
+        self.cats = EntityStore.from_records(Cat, cats)
+        self.raccoons = EntityStore.from_records(Raccoon, raccoons)
+
+    def prepare(self):
+        for building in self.buildings:
+            if building.surface is None:  # Some may have been rasterised ahead of time
+                building.prepare()
+    
+    def release(self):
+        # Drop cached surfaces so evicted chunks don't hold on to pixels
+        for building in self.buildings:
+            building.release()
+
+class ChunkStreamer:
+    def __init__(self, with_buildings=True):
+        # Generates chunks on a worker thread ahead of the player, the main thread collects them.
+        # Chunk generation only touches its own RNGs and NumPy, surfaces stay on the main thread
+        self.with_buildings = with_buildings
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.requested = set()  # (seed, density, index) still wanted
+        self.ready = {}  # (seed, density, index) -> generated Chunk
+        self.thread = threading.Thread(target=self.work, name="chunk-streamer", daemon=True)
+        self.thread.start()
+    
+    def work(self):
+        while True:
+            key = self.requests.get()
+            if key is None:
+                return
+            seed, density, index = key
+            self.results.put((key, Chunk(index, seed, density, self.with_buildings)))
+    
+    def request(self, seed, density, index):
+        key = (seed, density, index)
+        if key not in self.requested:
+            self.requested.add(key)
+            self.requests.put(key)
+    
+    def collect(self):
+        # Move finished chunks over, dropping any nobody wants any more
+        while True:
+            try:
+                key, chunk = self.results.get_nowait()
+            except queue.Empty:
+                return
+            if key in self.requested:
+                self.ready[key] = chunk
+    
+    def take(self, seed, density, index):
+        # The pre-generated chunk, or None if the worker hasn't finished it
+        self.collect()
+        key = (seed, density, index)
+        self.requested.discard(key)
+        return self.ready.pop(key, None)
+    
+    def integrate(self, budget=STREAM_BUDGET):
+        # Rasterise collected chunks' buildings until the budget runs out
+        self.collect()
+        deadline = time.perf_counter() + budget
+        for chunk in self.ready.values():
+            for building in chunk.buildings:
+                if building.surface is None:
+                    if time.perf_counter() >= deadline:
+                        return
+                    building.prepare()
+    
+    def retain(self, seed, density, first, last):
+        # Drop requests and finished chunks outside [first, last] of the current world
+        for key in [key for key in self.requested | self.ready.keys()
+                    if key[:2] != (seed, density) or not first <= key[2] <= last]:
+            self.requested.discard(key)
+            self.ready.pop(key, None)
+    
+    def cancel(self):
+        # Forget every request, e.g. when the world is rebuilt from a new seed
+        while True:
+            try:
+                self.requests.get_nowait()
+            except queue.Empty:
+                break
+        self.requested.clear()
+        self.ready.clear()
+    
+    def close(self):
+        self.cancel()
+        self.requests.put(None)
+        self.thread.join()
+
+class Simulation:
+    with_buildings = False  # Buildings only matter when something draws them
+    
+    def __init__(self, seed=None, density=1.0, profiler=None):
+        # Render-free gameplay: world streaming, movement, cooldowns, collisions and score
+        self.seed = seed
+        self.rng = random.Random(seed)  # Every generator path draws from this
+        self.density = density
+        self.profiler = profiler if profiler is not None else FrameProfiler()
+        self.frame = 0
+        self.reset_game()
+    
+    def make_player(self):
+        return Player()
+    
+    def reset_game(self):
+        self.player = self.make_player()
+        self.cats = EntityStore(Cat)
+        self.raccoons = EntityStore(Raccoon)
+        self.buildings = []
+        self.building_index = SpatialIndex(self.buildings)
+        self.live_chunks = []
+        self.score = 0
+        self.world_seed = self.rng.getrandbits(32)
+        self.chunks = {}  # Chunk index -> Chunk, only around the player
+        self.chunk_range = None
+        self.previous_player = (self.player.world_x, self.player.x, self.player.y)  # For interpolation
+        
+        # Generate initial world
+        self.update_world()
+    
+    @property
+    def distance(self):
+        return int(self.player.world_x / 10)  # Metres, as shown in the HUD
+    
+    def chunk_loaded(self, chunk):
+        pass
+    
+    def chunk_evicted(self, chunk):
+        pass
+    
+    def cat_touched(self, index):
+        pass
+    
+    def make_chunk(self, index):
+        return Chunk(index, self.world_seed, self.density, self.with_buildings)
+    
+    def update_world(self):
+        # Keep only the chunks around the camera alive
+        camera_x = self.player.world_x
+        self.generate_world(camera_x - CHUNKS_BEHIND * CHUNK_WIDTH,
+                            camera_x + SCREEN_WIDTH + CHUNKS_AHEAD * CHUNK_WIDTH)
+    
+    def generate_world(self, start_x, end_x):
+        first = max(0, start_x // CHUNK_WIDTH)
+        last = max(first, (end_x - 1) // CHUNK_WIDTH)
+        if (first, last) == self.chunk_range:
+            return  # Nothing to generate or evict
+        self.chunk_range = (first, last)
+        self.store_cooldowns()
+        
+        # Evict chunks outside the range, then fill in the missing ones
+        for index in list(self.chunks):
+            if index < first or index > last:
+                self.chunk_evicted(self.chunks.pop(index))
+        for index in range(first, last + 1):
+            if index not in self.chunks:
+                self.chunks[index] = self.make_chunk(index)
+                self.chunk_loaded(self.chunks[index])
+        
+        # Flatten the live chunks in world order
+        chunks = self.live_chunks = [self.chunks[index] for index in range(first, last + 1)]
+        self.buildings = [building for chunk in chunks for building in chunk.buildings]
+        self.building_index = SpatialIndex(self.buildings)
+        self.cats = EntityStore.concatenate(Cat, [chunk.cats for chunk in chunks])
+        self.raccoons = EntityStore.concatenate(Raccoon, [chunk.raccoons for chunk in chunks])
+        # Debug check: span() and colliding() binary-search world_x
+        assert all(np.all(store.world_x[1:] >= store.world_x[:-1]) for store in (self.cats, self.raccoons)), \
+            "Flattened entity stores are not sorted by world_x"
+    
+    def store_cooldowns(self):
+        # Copy cooldowns from the flattened stores back into the chunks they came from
+        cat_offset = raccoon_offset = 0
+        for chunk in self.live_chunks:
+            chunk.cats.ready_frame[:] = self.cats.ready_frame[cat_offset:cat_offset + len(chunk.cats)]
+            chunk.raccoons.ready_frame[:] = self.raccoons.ready_frame[raccoon_offset:raccoon_offset + len(chunk.raccoons)]
+            cat_offset += len(chunk.cats)
+            raccoon_offset += len(chunk.raccoons)
     
     def check_collisions(self):
         player_world_rect = pygame.Rect(self.player.world_x + self.player.x - 100, 
                                        self.player.y, self.player.width, self.player.height)
         
         # Check cat collisions
-        for cat in self.cats:
-            if cat.cooldown == 0:
-                cat_rect = pygame.Rect(cat.world_x, cat.y, cat.width, cat.height)
-                if player_world_rect.colliderect(cat_rect):
-                    cat.cooldown = 120  # 2 seconds at 60 FPS
-                    self.score += 10
-                    # Create heart effect
-                    heart_x = cat.get_screen_x(self.player.world_x) + cat.width // 2
-                    self.hearts.append(Heart(heart_x, cat.y - 10))
+        for index in self.cats.colliding(player_world_rect, self.frame).tolist():
+            self.cats.ready_frame[index] = self.frame + TOUCH_COOLDOWN
+            self.score += 10
+            self.cat_touched(index)
         
         # Check raccoon collisions
-        for raccoon in self.raccoons:
-            if raccoon.cooldown == 0:
-                raccoon_rect = pygame.Rect(raccoon.world_x, raccoon.y, raccoon.width, raccoon.height)
-                if player_world_rect.colliderect(raccoon_rect):
-                    raccoon.cooldown = 120  # 2 seconds at 60 FPS
-                    self.score = max(0, self.score - 5)  # Don't go below 0
+        for index in self.raccoons.colliding(player_world_rect, self.frame).tolist():
+            self.raccoons.ready_frame[index] = self.frame + TOUCH_COOLDOWN
+            self.score = max(0, self.score - 5)  # Don't go below 0
     
-    def draw_background(self, camera_x):
-        # Sky
-        self.screen.fill(BLUE)
+    def step(self, keys=None):
+        # Advance gameplay by one fixed SIM_DT step, keys default to the real keyboard
+        profiler = self.profiler
+        self.frame += 1
+        self.previous_player = (self.player.world_x, self.player.x, self.player.y)
+        self.player.update(keys)
+        profiler.mark("player.update")
         
-        # Draw buildings
-        for building in self.buildings:
-            building.draw(self.screen, camera_x)
+        # Stream chunks in and out as the player progresses
+        self.update_world()
+        profiler.mark("generate_world")
         
-        # Sidewalk
-        pygame.draw.rect(self.screen, GRAY, (0, 380, SCREEN_WIDTH, 120))
+        self.check_collisions()
+        profiler.mark("check_collisions")
+    
+    def state_checksum(self):
+        # Cheap fingerprint of the gameplay state, compared frame by frame on replay
+        checksum = zlib.crc32(struct.pack("<5q", self.frame, self.score, self.player.world_x,
+                                          self.player.x, self.player.y))
+        # Remaining frames rather than expiry frames, so recordings from the countdown days still verify
+        checksum = zlib.crc32(self.cats.cooldowns(self.frame).astype(np.int32).tobytes(), checksum)
+        return zlib.crc32(self.raccoons.cooldowns(self.frame).astype(np.int32).tobytes(), checksum)
+    
+    def pack_state(self):
+        # Header flags and the byte strings making up a snapshot body
+        self.store_cooldowns()
+        rng_version, rng_words, gauss_next = self.rng.getstate()
+        parts = [SNAPSHOT_STATE.pack(self.frame, self.score, self.player.world_x, self.player.x, self.player.y,
+                                     *self.previous_player, self.world_seed, self.density, len(self.chunks)),
+                 SNAPSHOT_RNG.pack(rng_version, float("nan") if gauss_next is None else gauss_next),
+                 pack_array(rng_words, np.uint32)]
+        for index in sorted(self.chunks):
+            chunk = self.chunks[index]
+            windows = [window for building in chunk.buildings for window in building.windows]
+            parts.append(SNAPSHOT_CHUNK.pack(index, len(chunk.buildings), len(windows),
+                                             len(chunk.cats), len(chunk.raccoons)))
+            parts.append(pack_array([(building.world_x, building.width, building.height, building.flicker_phase,
+                                      len(building.windows)) for building in chunk.buildings], np.int64))
+            parts.append(pack_array(windows, np.int64))
+            for store in (chunk.cats, chunk.raccoons):
+                parts += [pack_array(getattr(store, name), dtype) for name, dtype in EntityStore.FIELDS]
+        return SNAPSHOT_HAS_BUILDINGS if self.with_buildings else 0, parts
+    
+    def unpack_state(self, reader, flags):
+        (self.frame, self.score, self.player.world_x, self.player.x, self.player.y, *previous,
+         self.world_seed, self.density, chunk_count) = reader.unpack(SNAPSHOT_STATE)
+        self.previous_player = tuple(previous)
+        rng_version, gauss_next = reader.unpack(SNAPSHOT_RNG)
+        rng_words = tuple(reader.array(np.uint32, RNG_STATE_WORDS).tolist())
+        self.rng.setstate((rng_version, rng_words, None if np.isnan(gauss_next) else gauss_next))
         
-        # Road
-        pygame.draw.rect(self.screen, BLACK, (0, 500, SCREEN_WIDTH, 100))
+        for chunk in self.chunks.values():
+            self.chunk_evicted(chunk)
+        self.chunks = {}
+        for i in range(chunk_count):
+            index, building_count, window_count, cat_count, raccoon_count = reader.unpack(SNAPSHOT_CHUNK)
+            records = reader.array(np.int64, building_count * 5).reshape(-1, 5).tolist()
+            windows = [tuple(window) for window in reader.array(np.int64, window_count * 2).reshape(-1, 2).tolist()]
+            buildings = []
+            first_window = 0
+            for world_x, width, height, flicker_phase, count in records:
+                buildings.append(Building.restore(world_x, width, height, flicker_phase,
+                                                  windows[first_window:first_window + count]))
+                first_window += count
+            cats, raccoons = [EntityStore(view_class, {name: reader.array(dtype, count)
+                                                       for name, dtype in EntityStore.FIELDS})
+                              for view_class, count in ((Cat, cat_count), (Raccoon, raccoon_count))]
+            chunk = self.chunks[index] = Chunk.restore(index, self.density, buildings, cats, raccoons)
+            if self.with_buildings and not flags & SNAPSHOT_HAS_BUILDINGS:
+                # Taken from a render-free run, buildings regenerate from the world seed as usual
+                chunk.generate_buildings(chunk_rng(self.world_seed, index, "buildings"))
+            self.chunk_loaded(chunk)
         
-        # Road lines (moving with camera)
-        line_offset = int(camera_x % 60)
-        for i in range(-line_offset, SCREEN_WIDTH + 60, 60):
-            pygame.draw.rect(self.screen, WHITE, (i, 545, 30, 5))
+        # Flatten the restored chunks, nothing needs generating
+        self.chunk_range = None
+        self.live_chunks = []
+        self.update_world()
     
-    def draw_start_screen(self):
-        # Animated gradient background
-        self.start_time += 1
+    def snapshot(self, compress=True):
+        # Versioned binary copy of the whole gameplay state
+        flags, parts = self.pack_state()
+        body = b"".join(parts)
+        if compress:
+            flags |= SNAPSHOT_COMPRESSED
+            body = zlib.compress(body, 1)  # Checkpoints favour speed over size
+        return SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags) + body
+    
+    def restore(self, data):
+        magic, version, flags = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"Not a version {SNAPSHOT_VERSION} snapshot")
+        body = data[SNAPSHOT_HEADER.size:]
+        if flags & SNAPSHOT_COMPRESSED:
+            body = zlib.decompress(body)
+        self.unpack_state(SnapshotReader(body), flags)
+    
+    def save_snapshot(self, path):
+        with open(path, "wb") as snapshot_file:
+            snapshot_file.write(self.snapshot())
+    
+    def load_snapshot(self, path):
+        with open(path, "rb") as snapshot_file:
+            self.restore(snapshot_file.read())
+
+class Game(Simulation):
+    with_buildings = True
+    
+    def __init__(self, headless=False, seed=None, density=1.0, fps=FPS, profile=False, profile_out=None,
+                 record_path=None, checkpoint_path=None, quality=None):
+        if headless:
+            # No window or audio device, e.g. for benchmarks in CI
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
+        pygame.init()
+        self.headless = headless
+        self.fps = fps  # 0 runs uncapped
+        self.quality = QualityGovernor(1 / (fps or FPS), quality)
+        self.frame_started = time.perf_counter()  # End of the previous frame's cap wait
+        self.panel_surface = None
+        self.profiler = FrameProfiler(profile, profile_out)
+        self.profiler.show_overlay = profile
+        self.record_path = record_path
+        self.recording = None
+        self.checkpoint_path = checkpoint_path  # F5 saves here and F9 restores, in memory if None
+        self.checkpoint = None
+        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption("Cheryl's Cat Adventure")
+        build_sprites()
+        self.clock = pygame.time.Clock()
+        self.state = "START"  # START, PLAYING, GAME_OVER
+        self.start_time = 0  # For animations
+        self.gradient_cache = LRUCache(GRADIENT_CACHE_SIZE)
+        self.assets = AssetManager()
+        self.text = TextRenderer()
+        self.street = StreetRenderer()
+        self.streamer = ChunkStreamer()
+        self.start_effects = None  # Floating cats and stars on the start screen
+        super().__init__(seed, density, self.profiler)
+        self.init_start_screen_effects()
+        
+    def make_player(self):
+        return Player(self.assets.scaled("cheryl.png", (30, 40)))
+    
+    def reset_game(self):
+        self.particles = ParticlePool()
+        self.font = self.assets.font(None, 36)
+        self.big_font = self.assets.font(None, 72)
+        self.spawn_timer = 0
+        self.street.invalidate()
+        self.streamer.cancel()
+        super().reset_game()
+    
+    def chunk_loaded(self, chunk):
+        chunk.prepare()
+    
+    def make_chunk(self, index):
+        # Prefer the background worker's copy, generating synchronously only if it isn't done
+        chunk = self.streamer.take(self.world_seed, self.density, index)
+        return chunk if chunk is not None else super().make_chunk(index)
+    
+    def generate_world(self, start_x, end_x):
+        previous_range = self.chunk_range
+        super().generate_world(start_x, end_x)
+        if self.chunk_range == previous_range:
+            return
+        # Queue the chunks either side of the new live range before the player reaches them
+        first, last = self.chunk_range
+        self.streamer.retain(self.world_seed, self.density, first - CHUNKS_PREFETCH, last + CHUNKS_PREFETCH)
+        for index in range(max(0, first - CHUNKS_PREFETCH), first):
+            self.streamer.request(self.world_seed, self.density, index)
+        for index in range(last + 1, last + 1 + CHUNKS_PREFETCH):
+            self.streamer.request(self.world_seed, self.density, index)
+    
+    def chunk_evicted(self, chunk):
+        chunk.release()
+    
+    def cat_touched(self, index):
+        # Create heart effect
+        heart_x = int(self.cats.world_x[index]) - self.player.world_x + Cat.width // 2
+        heart_y = int(self.cats.y[index]) - 10
+        self.particles.spawn(PARTICLE_HEART, heart_x, heart_y, 0, -Heart.speed, Heart.lifetime)
+        speed = SPARKLE_SPEED / SIM_RATE
+        for dx, dy in SPARKLE_DIRECTIONS:
+            self.particles.spawn(PARTICLE_SPARKLE, heart_x, heart_y, dx * speed, dy * speed, steps(SPARKLE_LIFETIME))
+    
+    def init_start_screen_effects(self):
+        # Sized for the best quality tier, lower tiers animate a prefix.
+        # One draw from self.rng seeds them, so the world never depends on how long the start screen ran
+        best = QUALITY_TIERS[0]
+        self.start_effects = StartScreenEffects(np.random.default_rng(self.rng.getrandbits(32)),
+                                                best["stars"], best["floating_cats"])
+    
+    def draw_gradient_background(self, color1, color2):
+        # Gradients only depend on their endpoints, so reuse them across frames
+        color1, color2 = quantise_color(color1), quantise_color(color2)
+        gradient = self.gradient_cache.get((color1, color2), lambda: make_gradient_surface(
+            color1, color2, SCREEN_WIDTH, SCREEN_HEIGHT).convert())
+        self.screen.blit(gradient, (0, 0))
+    
+    def draw_background(self, camera_x):
+        # Sky, buildings and road come from the scrolling background layer
+        self.street.begin(self.screen, camera_x, self.building_index)
+        
+        # Flickering windows inside the camera window
+        if not self.quality.tier["window_flicker"]:
+            return
+        blits = []
+        for building in self.building_index.query(camera_x - 100, camera_x + SCREEN_WIDTH + 100):
+            blits += building.flicker_blits(camera_x, self.frame)
+        self.street.add(self.screen.blits(blits))
+    
+    def draw_entities(self, camera_x, alpha=1.0):
+        # Cats, raccoons and particles all come from the sprite atlas in one batch
+        view_start, view_end = camera_x - 50, camera_x + SCREEN_WIDTH + 50
+        lo, hi = self.cats.span(view_start, view_end)
+        blits = [SPRITES.entry("cat", world_x - camera_x, y)
+                 for world_x, y in zip(self.cats.world_x[lo:hi].tolist(), self.cats.y[lo:hi].tolist())]
+        lo, hi = self.raccoons.span(view_start, view_end)
+        blits += [SPRITES.entry("raccoon" if ready_frame <= self.frame else "raccoon_cooldown", world_x - camera_x, y)
+                  for world_x, y, ready_frame in zip(self.raccoons.world_x[lo:hi].tolist(), self.raccoons.y[lo:hi].tolist(),
+                                                     self.raccoons.ready_frame[lo:hi].tolist())]
+        blits += self.particles.blits(alpha)
+        self.street.add(self.screen.blits(blits))
+    
+    def draw_start_screen(self, ticks=1):
+        # Animated gradient background, ticks is how many 60 Hz frames of animation to advance
+        self.start_time += ticks
         color_shift = abs(int(20 * pygame.math.Vector2(1, 0).rotate(self.start_time * 2).x))
         sky_color = (135 + color_shift, 206, 235)
         sunset_color = (255, 180 + color_shift // 2, 100)
         self.draw_gradient_background(sky_color, sunset_color)
         
+        tier = self.quality.tier
+        
         # Animated twinkling stars
-        for star in self.stars:
-            brightness_shift = int(50 * abs(pygame.math.Vector2(1, 0).rotate(self.start_time * star['twinkle_speed']).x))
-            brightness = min(255, star['brightness'] + brightness_shift)
-            pygame.draw.circle(self.screen, (brightness, brightness, brightness), 
-                             (star['x'], star['y']), random.randint(1, 2))
+        self.start_effects.draw_stars(self.screen, self.start_time, tier["stars"])
         
         # Floating animated cats
-        for cat in self.floating_cats:
-            # Update cat position
-            cat['x'] += pygame.math.Vector2(cat['speed'], 0).rotate(cat['direction']).x * 0.5
-            cat['y'] += pygame.math.Vector2(cat['speed'], 0).rotate(cat['direction']).y * 0.3
-            
-            # Add bobbing motion
-            bob = 3 * pygame.math.Vector2(1, 0).rotate(self.start_time * 0.1 + cat['bob_offset']).y
-            cat['y'] += bob * 0.1
-            
-            # Wrap around screen
-            if cat['x'] < -30: cat['x'] = SCREEN_WIDTH + 30
-            if cat['x'] > SCREEN_WIDTH + 30: cat['x'] = -30
-            if cat['y'] < -30: cat['y'] = SCREEN_HEIGHT + 30
-            if cat['y'] > SCREEN_HEIGHT + 30: cat['y'] = -30
-            
-            # Draw floating cat with size variation
-            size = int(20 * cat['size'])
-            glow_size = int(size * 1.2)
-            
-            # Glow effect
-            glow_color = (255, 200, 100, 50)
-            pygame.draw.circle(self.screen, (255, 200, 100), (int(cat['x']), int(cat['y'])), glow_size)
-            
-            # Cat body
-            pygame.draw.rect(self.screen, ORANGE, 
-                           (int(cat['x'] - size//2), int(cat['y'] - size//2), size, int(size*0.75)))
-            # Ears
-            ear_size = size // 3
-            pygame.draw.polygon(self.screen, ORANGE, [
-                (int(cat['x'] - size//3), int(cat['y'] - size//2)),
-                (int(cat['x'] - size//6), int(cat['y'] - size//2 - ear_size)),
-                (int(cat['x']), int(cat['y'] - size//2))
-            ])
-            pygame.draw.polygon(self.screen, ORANGE, [
-                (int(cat['x']), int(cat['y'] - size//2)),
-                (int(cat['x'] + size//6), int(cat['y'] - size//2 - ear_size)),
-                (int(cat['x'] + size//3), int(cat['y'] - size//2))
-            ])
+        self.start_effects.update_cats(ticks, self.start_time, tier["floating_cats"])
+        self.start_effects.draw_cats(self.screen, tier["floating_cats"])
         
         # Animated title with glow effect
         title_bounce = 5 * abs(pygame.math.Vector2(1, 0).rotate(self.start_time * 0.05).y)
         title_y = 120 + title_bounce
         
         # Title glow
-        for offset in range(5, 0, -1):
+        for offset in range(tier["glow_passes"], 0, -1):
             glow_alpha = 255 - offset * 40
-            title_glow = self.big_font.render("Cheryl's Cat Adventure", True, (255, 255, 150))
+            title_glow = self.text.render(self.big_font, "Cheryl's Cat Adventure", (255, 255, 150))
             for dx, dy in [(-offset, -offset), (offset, -offset), (-offset, offset), (offset, offset)]:
                 self.screen.blit(title_glow, (SCREEN_WIDTH//2 - title_glow.get_width()//2 + dx, title_y + dy))
         
         # Main title
-        title = self.big_font.render("Cheryl's Cat Adventure", True, (50, 50, 150))
+        title = self.text.render(self.big_font, "Cheryl's Cat Adventure", (50, 50, 150))
         title_rect = title.get_rect(center=(SCREEN_WIDTH // 2, title_y))
         self.screen.blit(title, title_rect)
         
         # Animated instruction panel with transparency effect
-        panel_alpha = 200 + int(30 * pygame.math.Vector2(1, 0).rotate(self.start_time * 0.03).x)
-        panel_surface = pygame.Surface((600, 350))
-        panel_surface.set_alpha(panel_alpha)
-        panel_surface.fill((20, 20, 40))
-        panel_rect = panel_surface.get_rect(center=(SCREEN_WIDTH // 2, 350))
-        self.screen.blit(panel_surface, panel_rect)
+        panel_rect = pygame.Rect(0, 0, 600, 350)
+        panel_rect.center = (SCREEN_WIDTH // 2, 350)
+        if tier["translucent_panel"]:
+            panel_alpha = 200 + int(30 * pygame.math.Vector2(1, 0).rotate(self.start_time * 0.03).x)
+            if self.panel_surface is None:
+                self.panel_surface = pygame.Surface(panel_rect.size).convert()
+                self.panel_surface.fill((20, 20, 40))
+            self.panel_surface.set_alpha(panel_alpha)
+            self.screen.blit(self.panel_surface, panel_rect)
+        else:
+            self.screen.fill((20, 20, 40), panel_rect)
         
         # Instructions with color animations
         instructions = [
@@ -417,44 +1627,184 @@ class Game:
                 
                 if instruction.startswith("CONTROLS:") or instruction.startswith("SCORING:"):
                     color = (255, 200 + color_cycle, 100)
-                    text = self.font.render(instruction, True, color)
+                    text = self.text.render(self.font, instruction, color)
                 elif instruction == "Press SPACE to start!":
                     # Pulsing start instruction
                     pulse = int(100 * abs(pygame.math.Vector2(1, 0).rotate(self.start_time * 0.1).x))
                     color = (255, 150 + pulse, 150 + pulse)
-                    text = self.font.render(instruction, True, color)
+                    text = self.text.render(self.font, instruction, color)
                 else:
                     color = (200 + color_cycle, 200 + color_cycle, 255)
-                    text = self.font.render(instruction, True, color)
+                    text = self.text.render(self.font, instruction, color)
                 
                 text_rect = text.get_rect(center=(SCREEN_WIDTH // 2, y))
                 self.screen.blit(text, text_rect)
                 y += 30
         
         # Floating hearts animation
+        heart_blits = []
         for i in range(5):
             heart_x = 100 + i * 200 + 30 * pygame.math.Vector2(1, 0).rotate(self.start_time * 0.02 + i).x
             heart_y = 500 + 20 * pygame.math.Vector2(1, 0).rotate(self.start_time * 0.03 + i * 2).y
-            
-            # Draw hearts
-            pygame.draw.circle(self.screen, RED, (int(heart_x - 3), int(heart_y - 2)), 4)
-            pygame.draw.circle(self.screen, RED, (int(heart_x + 3), int(heart_y - 2)), 4)
-            pygame.draw.polygon(self.screen, RED, [
-                (int(heart_x - 6), int(heart_y)), 
-                (int(heart_x), int(heart_y + 8)), 
-                (int(heart_x + 6), int(heart_y))
-            ])
+            heart_blits.append(SPRITES.entry("heart", int(heart_x), int(heart_y)))
+        self.screen.blits(heart_blits, False)
     
     def draw_ui(self):
-        score_text = self.font.render(f"Score: {self.score}", True, BLACK)
-        self.screen.blit(score_text, (10, 10))
+        return [self.text.draw_number(self.screen, self.font, "Score: ", self.score, "", BLACK, (10, 10)),
+                self.text.draw_number(self.screen, self.font, "Distance: ", self.distance, "m", BLACK, (10, 50))]
+    
+    def step(self, keys=None):
+        # Update hearts and other particles before collisions spawn this frame's new ones
+        self.particles.update()
+        self.profiler.mark("particles")
+        super().step(keys)
+    
+    def draw_playing(self, alpha=1.0):
+        # Render alpha of the way from the previous simulation step to the current one
+        previous_world_x, previous_x, previous_y = self.previous_player
+        camera_x = round(previous_world_x + (self.player.world_x - previous_world_x) * alpha)
+        player_x = round(previous_x + (self.player.x - previous_x) * alpha)
+        player_y = round(previous_y + (self.player.y - previous_y) * alpha)
+        self.draw_background(camera_x)
         
-        distance_text = self.font.render(f"Distance: {int(self.player.world_x / 10)}m", True, BLACK)
-        self.screen.blit(distance_text, (10, 50))
+        self.draw_entities(camera_x, alpha)
+        
+        self.player.draw(self.screen, player_x, player_y)
+        self.street.add([pygame.Rect(player_x, player_y, self.player.width, self.player.height)])
+        self.street.add(self.draw_ui())
+        self.profiler.mark("draw")
+    
+    def state_checksum(self):
+        return zlib.crc32(self.particles.records[:self.particles.count].tobytes(), super().state_checksum())
+    
+    def pack_state(self):
+        flags, parts = super().pack_state()
+        live = self.particles.records[:self.particles.count]
+        return flags | SNAPSHOT_HAS_PARTICLES, parts + [SNAPSHOT_PARTICLES.pack(len(live)), pack_array(live, np.float32)]
+    
+    def unpack_state(self, reader, flags):
+        super().unpack_state(reader, flags)
+        self.particles.clear()
+        if flags & SNAPSHOT_HAS_PARTICLES:
+            (count,) = reader.unpack(SNAPSHOT_PARTICLES)
+            records = reader.array(np.float32, count * 6).reshape(count, 6)[:len(self.particles.records)]
+            self.particles.records[:len(records)] = records
+            self.particles.count = len(records)
+        self.street.invalidate()
+    
+    def start_run(self):
+        # Leave the start screen, reseeding first so a recording can rebuild this exact world
+        self.state = "PLAYING"
+        if self.record_path is not None:
+            seed = self.seed if self.seed is not None else random.randrange(2 ** 32)
+            self.recording = InputRecording(seed, self.density)
+            self.rng = random.Random(seed)
+        self.reset_game()
+    
+    def finish_frame(self, rendered=True):
+        # Present the frame if one was drawn, then the per-frame work that runs either way
+        if rendered:
+            overlay_rect = self.profiler.draw_overlay(self.screen)
+            if overlay_rect is not None:
+                self.street.add([overlay_rect])
+            self.profiler.mark("overlay")
+            if self.state == "PLAYING":
+                self.street.present()
+            else:
+                pygame.display.flip()
+            self.profiler.mark("present")
+        self.streamer.integrate()
+        self.profiler.mark("stream")
+        if self.profiler.enabled:
+            self.profiler.end_frame(self.entity_counts())
+        # Judge quality on the work done this frame, not on the time spent waiting for the cap
+        self.quality.record(time.perf_counter() - self.frame_started)
+        self.clock.tick(self.fps)
+        self.frame_started = time.perf_counter()
+    
+    def replay(self, recording, draw=True):
+        # Re-run a recording as fast as self.fps allows, returns (frames, seconds, first diverging frame)
+        self.rng = random.Random(recording.seed)
+        self.state = "PLAYING"
+        self.reset_game()
+        divergence = None
+        frames = 0
+        start = time.perf_counter()
+        for frame, mask in enumerate(recording.masks):
+            self.profiler.begin_frame()
+            if any(event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE)
+                   for event in pygame.event.get()):
+                break
+            self.profiler.mark("events")
+            if mask & REPLAY_RESET:
+                self.reset_game()
+            self.step(unpack_keys(mask))
+            if divergence is None and recording.checksums and self.state_checksum() != recording.checksums[frame]:
+                divergence = frame
+            if draw:
+                self.draw_playing()
+                self.finish_frame()
+            frames += 1
+        return frames, time.perf_counter() - start, divergence
+    
+    def entity_counts(self):
+        return {"buildings": len(self.buildings), "cats": len(self.cats),
+                "raccoons": len(self.raccoons), "hearts": self.particles.count_kind(PARTICLE_HEART)}
+    
+    def step_input(self):
+        # One simulation step on the live keyboard, recorded when a recording is running
+        if self.recording is not None:
+            # Step on exactly what gets recorded so the replay can't drift
+            mask = pack_keys(pygame.key.get_pressed())
+            self.step(unpack_keys(mask))
+            self.recording.append(mask | self.pending_flags, self.state_checksum())
+        else:
+            self.step()
+        self.pending_flags = 0
+    
+    def advance(self, frame_time):
+        # Run as many fixed steps as real time calls for, returns the render interpolation
+        # factor, or None to skip this render while the simulation catches up
+        self.accumulator += frame_time
+        steps = 0
+        while self.accumulator >= SIM_DT and steps < MAX_STEPS_PER_FRAME:
+            self.step_input()
+            self.accumulator -= SIM_DT
+            steps += 1
+        if self.accumulator >= SIM_DT:
+            if self.skipped_renders < MAX_SKIPPED_RENDERS:
+                self.skipped_renders += 1
+                return None
+            # Still behind after skipping, drop the backlog rather than spiral
+            self.accumulator %= SIM_DT
+        self.skipped_renders = 0
+        return self.accumulator / SIM_DT
+    
+    def save_checkpoint(self):
+        self.checkpoint = self.snapshot()
+        if self.checkpoint_path is not None:
+            with open(self.checkpoint_path, "wb") as checkpoint_file:
+                checkpoint_file.write(self.checkpoint)
+    
+    def load_checkpoint(self):
+        if self.checkpoint is None and self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "rb") as checkpoint_file:
+                self.checkpoint = checkpoint_file.read()
+        if self.checkpoint is not None:
+            self.restore(self.checkpoint)
+            self.accumulator = 0.0
     
     def run(self):
         running = True
+        self.accumulator = 0.0
+        self.skipped_renders = 0
+        self.pending_flags = 0  # Recording flags waiting for the next simulation step
+        last_time = time.perf_counter()
         while running:
+            self.profiler.begin_frame()
+            now = time.perf_counter()
+            frame_time = min(now - last_time, MAX_FRAME_TIME)
+            last_time = now
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
@@ -462,58 +1812,85 @@ class Game:
                     if event.key == pygame.K_ESCAPE:
                         running = False
                     elif event.key == pygame.K_SPACE and self.state == "START":
-                        self.state = "PLAYING"
-                        self.reset_game()
+                        self.start_run()
+                        self.accumulator = 0.0
                     elif event.key == pygame.K_r and self.state == "PLAYING":
                         self.reset_game()
+                        self.pending_flags |= REPLAY_RESET
+                    elif event.key == pygame.K_F3:
+                        self.profiler.toggle_overlay()
+                    elif event.key == pygame.K_F5 and self.state == "PLAYING":
+                        self.save_checkpoint()
+                    elif event.key == pygame.K_F9 and self.state == "PLAYING" and self.recording is None:
+                        # A recording can't express the jump, so checkpoints only restore outside one
+                        self.load_checkpoint()
+            self.profiler.mark("events")
             
+            rendered = True
             if self.state == "START":
-                self.draw_start_screen()
+                self.draw_start_screen(frame_time * 60)  # Start-screen motion is tuned per 60 Hz frame
+                self.street.invalidate()
+                self.profiler.mark("draw")
             elif self.state == "PLAYING":
-                # Update
-                self.player.update()
-                
-                # Generate more world as player progresses
-                if self.player.world_x > self.last_spawn_x - 1000:
-                    self.generate_world(self.last_spawn_x, self.last_spawn_x + 2000)
-                    self.last_spawn_x += 2000
-                
-                # Update cats and raccoons
-                for cat in self.cats:
-                    cat.update()
-                for raccoon in self.raccoons:
-                    raccoon.update()
-                
-                # Update hearts
-                for heart in self.hearts[:]:
-                    heart.update()
-                    if heart.lifetime <= 0:
-                        self.hearts.remove(heart)
-                
-                self.check_collisions()
-                
-                # Draw
-                camera_x = self.player.world_x
-                self.draw_background(camera_x)
-                
-                for cat in self.cats:
-                    cat.draw(self.screen, camera_x)
-                
-                for raccoon in self.raccoons:
-                    raccoon.draw(self.screen, camera_x)
-                
-                for heart in self.hearts:
-                    heart.draw(self.screen)
-                
-                self.player.draw(self.screen)
-                self.draw_ui()
+                alpha = self.advance(frame_time)
+                rendered = alpha is not None  # None skips this render while the simulation catches up
+                if rendered:
+                    self.draw_playing(alpha)
             
-            pygame.display.flip()
-            self.clock.tick(FPS)
+            self.finish_frame(rendered)
         
+        if self.recording is not None:
+            self.recording.save(self.record_path)
+        self.streamer.close()
+        self.profiler.close()
         pygame.quit()
         sys.exit()
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cheryl's Cat Adventure")
+    parser.add_argument("--seed", type=int, help="seed the world for a reproducible run (0 to 2**64 - 1)")
+    parser.add_argument("--profile", action="store_true", help="show the frame profiler overlay (toggle with F3)")
+    parser.add_argument("--profile-out", metavar="PATH", help="write per-frame timings to PATH (.csv or JSON lines)")
+    parser.add_argument("--record", metavar="PATH", help="record the seed and every frame's input to PATH")
+    parser.add_argument("--replay", metavar="PATH", help="replay a recording instead of playing")
+    parser.add_argument("--snapshot-out", metavar="PATH", help="save a snapshot of the final state after a replay")
+    parser.add_argument("--resume", metavar="PATH", help="start playing from a saved snapshot")
+    parser.add_argument("--checkpoint", metavar="PATH", help="file F5 saves the current state to and F9 restores")
+    parser.add_argument("--headless", action="store_true", help="run without a window")
+    parser.add_argument("--no-draw", action="store_true", help="replay without rendering")
+    parser.add_argument("--quality", type=int, choices=range(len(QUALITY_TIERS)),
+                        help="pin a quality tier, 0 looks best (default adapts to the frame budget)")
+    parser.add_argument("--fps", type=int, help="render cap, 0 for uncapped (replays default to uncapped); "
+                        "gameplay always runs at a fixed rate")
+    args = parser.parse_args()
+    if args.seed is not None and not 0 <= args.seed < 2 ** 64:
+        parser.error("--seed must be between 0 and 2**64 - 1, recordings store it as an unsigned 64-bit value")
+    if args.resume and args.record:
+        parser.error("--record starts from a fresh world and can't be combined with --resume")
+    return args
+
 if __name__ == "__main__":
-    game = Game()
+    args = parse_args()
+    if args.replay:
+        recording = InputRecording.load(args.replay)
+        game = Game(headless=args.headless, seed=recording.seed, density=recording.density,
+                    fps=0 if args.fps is None else args.fps, profile=args.profile, profile_out=args.profile_out,
+                    quality=args.quality)
+        frames, seconds, divergence = game.replay(recording, draw=not args.no_draw)
+        print(f"Replayed {frames}/{len(recording)} frames in {seconds:.2f}s "
+              f"({frames / max(seconds, 1e-9):.0f} fps), score {game.score}")
+        if divergence is not None:
+            print(f"State diverged from the recording at frame {divergence}")
+        if args.snapshot_out:
+            game.save_snapshot(args.snapshot_out)
+        game.streamer.close()
+        game.profiler.close()
+        pygame.quit()
+        sys.exit(1 if divergence is not None else 0)
+    game = Game(headless=args.headless, seed=args.seed, fps=FPS if args.fps is None else args.fps,
+                profile=args.profile, profile_out=args.profile_out, record_path=args.record,
+                checkpoint_path=args.checkpoint, quality=args.quality)
+    if args.resume:
+        game.load_snapshot(args.resume)
+        game.state = "PLAYING"
     game.run()
\ No newline at end of file
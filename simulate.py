@@ -0,0 +1,203 @@
+"""Render-free Monte Carlo runs of Cheryl's Cat Adventure for balancing.
+
+Plays many seeded runs with a bot policy across a process pool and streams
+the aggregated score and distance distributions as batches finish.
+
+    python simulate.py --runs 100000 --frames 3600 --policy greedy --workers 8
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+import p
+from p import KeyState, Simulation
+
+RIGHT = KeyState((pygame.K_RIGHT,))
+RIGHT_UP = KeyState((pygame.K_RIGHT, pygame.K_UP))
+RIGHT_DOWN = KeyState((pygame.K_RIGHT, pygame.K_DOWN))
+
+
+# Policies: policy_factory(seed) returns policy(sim) -> keys for one frame
+
+def run_right(seed):
+    # Hold right and never leave the sidewalk
+    return lambda sim: RIGHT
+
+
+def random_hops(seed):
+    # Hold right and pick a new vertical direction every half second
+    rng = random.Random(seed)
+    choice = [RIGHT]
+
+    def policy(sim):
+        if sim.frame % 30 == 0:
+            choice[0] = rng.choice((RIGHT, RIGHT_UP, RIGHT_DOWN))
+        return choice[0]
+    return policy
+
+
+def greedy(seed):
+    # Hold right and line up with the nearest cat ahead that isn't on cooldown
+    def policy(sim):
+        player = sim.player
+        player_x = player.world_x + player.x - 100
+        lo, hi = sim.cats.span(player_x, player_x + 300)
+        ready = (sim.cats.ready_frame[lo:hi] <= sim.frame).nonzero()[0]
+        target_y = 430 if len(ready) == 0 else int(sim.cats.y[lo + ready[0]]) - 10
+        if player.y > target_y + 5:
+            return RIGHT_UP
+        if player.y < target_y - 5:
+            return RIGHT_DOWN
+        return RIGHT
+    return policy
+
+
+POLICIES = {"run_right": run_right, "random": random_hops, "greedy": greedy}
+
+
+def set_spawn_rates(rates):
+    # Pool initializer, so every worker generates chunks with the rates under test
+    for name, value in rates.items():
+        setattr(p, name, value)
+
+
+def simulate_run(policy_name, seed, frames, density):
+    sim = Simulation(seed, density)
+    policy = POLICIES[policy_name](seed)
+    for frame in range(frames):
+        sim.step(policy(sim))
+    return sim.score, sim.distance
+
+
+def simulate_batch(policy_name, seeds, frames, density):
+    # One pool task per slice of seeds, so process overhead is paid per batch rather than per run
+    return [simulate_run(policy_name, seed, frames, density) for seed in seeds]
+
+
+class Distribution:
+    def __init__(self, bucket):
+        # Streaming summary: moments plus a fixed-width histogram for percentiles
+        self.bucket = bucket
+        self.histogram = {}
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.low = math.inf
+        self.high = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.total_squares += value * value
+        self.low = min(self.low, value)
+        self.high = max(self.high, value)
+        key = value // self.bucket
+        self.histogram[key] = self.histogram.get(key, 0) + 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def stdev(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(max(0.0, self.total_squares / self.count - self.mean ** 2))
+
+    def percentile(self, pct):
+        # Interpolated inside the bucket holding the pct-th value, clamped to the values actually seen
+        target = self.count * pct / 100
+        seen = 0
+        for key in sorted(self.histogram):
+            in_bucket = self.histogram[key]
+            if seen + in_bucket >= target:
+                value = round((key + (target - seen) / in_bucket) * self.bucket)
+                return min(max(value, self.low), self.high)
+            seen += in_bucket
+        return self.high
+
+    def summary(self):
+        return (f"mean {self.mean:9.1f}  sd {self.stdev:8.1f}  min {self.low:7}  p50 {self.percentile(50):7}"
+                f"  p90 {self.percentile(90):7}  p99 {self.percentile(99):7}  max {self.high:7}")
+
+    def to_json(self):
+        return {"bucket": self.bucket, "count": self.count, "mean": self.mean, "stdev": self.stdev,
+                "min": self.low, "max": self.high,
+                "histogram": {str(key * self.bucket): count for key, count in sorted(self.histogram.items())}}
+
+
+def run_batches(args):
+    scores = Distribution(args.score_bucket)
+    distances = Distribution(args.distance_bucket)
+    seeds = iter(range(args.seed_start, args.seed_start + args.runs))
+    start = time.perf_counter()
+
+    def next_batch():
+        return list(itertools.islice(seeds, args.batch_size))
+
+    rates = {"CAT_CHANCE": args.cat_chance, "BALCONY_CAT_CHANCE": args.balcony_cat_chance,
+             "RACCOON_CHANCE": args.raccoon_chance}
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=set_spawn_rates, initargs=(rates,)) as pool:
+        # Keep a bounded number of batches in flight so millions of runs don't queue up at once
+        pending = set()
+        while True:
+            while len(pending) < args.workers * 4:
+                batch = next_batch()
+                if not batch:
+                    break
+                pending.add(pool.submit(simulate_batch, args.policy, batch, args.frames, args.density))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for score, distance in future.result():
+                    scores.add(score)
+                    distances.add(distance)
+            elapsed = time.perf_counter() - start
+            print(f"\r{scores.count}/{args.runs} runs  {scores.count / elapsed:8.1f} runs/s  "
+                  f"mean score {scores.mean:8.1f}  mean distance {distances.mean:8.1f}m",
+                  end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    return scores, distances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--frames", type=int, default=3600, help="frames per run, 60 per second of play")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--density", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=20, help="runs per pool task")
+    parser.add_argument("--cat-chance", type=float, default=p.CAT_CHANCE)
+    parser.add_argument("--balcony-cat-chance", type=float, default=p.BALCONY_CAT_CHANCE)
+    parser.add_argument("--raccoon-chance", type=float, default=p.RACCOON_CHANCE)
+    parser.add_argument("--seed-start", type=int, default=0)
+    parser.add_argument("--score-bucket", type=int, default=10)
+    parser.add_argument("--distance-bucket", type=int, default=10)
+    parser.add_argument("--json", metavar="PATH", help="also write the distributions as JSON")
+    args = parser.parse_args()
+
+    scores, distances = run_batches(args)
+    print(f"score     {scores.summary()}")
+    print(f"distance  {distances.summary()}")
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump({"policy": args.policy, "runs": scores.count, "frames": args.frames, "density": args.density,
+                       "cat_chance": args.cat_chance, "balcony_cat_chance": args.balcony_cat_chance,
+                       "raccoon_chance": args.raccoon_chance,
+                       "score": scores.to_json(), "distance": distances.to_json()}, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()